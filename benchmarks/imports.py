@@ -0,0 +1,75 @@
+"""Import-time regression check for the numpy-only core of wzai
+
+Every core module is imported in a fresh interpreter. The check fails
+when one of them pulls in a heavy optional dependency, or takes longer
+than the budget to import:
+
+    python benchmarks/imports.py
+    python benchmarks/imports.py --budget 0.3
+"""
+from typing import List, Optional
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Modules that must import with nothing heavier than numpy
+CORE = [
+    "wzai",
+    "wzai.types",
+    "wzai.orders",
+    "wzai.engine",
+    "wzai.agents",
+    "wzai.actions",
+    "wzai.search",
+    "wzai.mapstore",
+    "wzai.instrument",
+    "wzai.replay",
+    "wzai.dataset",
+]
+
+HEAVY = ["requests", "urllib3", "networkx", "gymnasium", "wonderwords", "torch", "torch_geometric", "aiohttp"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{ "seconds": seconds, "heavy": sorted(set({heavy!r}) & set(sys.modules)) }}))
+"""
+
+def probe(module: str) -> dict:
+    # numpy is imported first, so the time is wzai's own rather than numpy's
+    result = subprocess.run(
+        [sys.executable, "-c", "import numpy\n" + PROBE.format(module=module, heavy=HEAVY)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check that the wzai core imports quickly and without heavy dependencies")
+    parser.add_argument("--budget", type=float, default=0.2, help="seconds each module may take to import, numpy aside")
+    args = parser.parse_args(argv)
+
+    failures = []
+    for module in CORE:
+        result = probe(module)
+        problems = []
+        if result["heavy"]:
+            problems.append("imports " + ", ".join(result["heavy"]))
+        if result["seconds"] > args.budget:
+            problems.append(f"over the {args.budget}s budget")
+        print(f"{module:<20} {result['seconds'] * 1e3:8.1f} ms  {'; '.join(problems) or 'ok'}")
+        failures.extend(f"{module} {problem}" for problem in problems)
+    for failure in failures:
+        print(f"Failed: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
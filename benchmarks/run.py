@@ -0,0 +1,189 @@
+"""Offline benchmarks of the hot paths, for every api.MapID
+
+Maps come from a map store when one is given and has them, and are
+otherwise replaced by a synthetic map with the same number of territories
+and bonuses, so the suite never touches the network. Every benchmark
+reports calls per second and the peak memory allocated by one call:
+
+    python benchmarks/run.py                                  report only
+    python benchmarks/run.py --save-baseline before.json      record a baseline
+    python benchmarks/run.py --baseline before.json           compare against it
+    python benchmarks/run.py --maps BANANA ITALY --cache maps
+
+With --baseline, the exit status is 1 when anything got slower than the
+tolerance allows. Baselines are only comparable on the machine that
+recorded them, so none is kept in the repository.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from wzai import api, engine, mapstore
+from wzai.agents import Random
+from wzai.types import Bonus, MapState, MapStructure
+
+# (territories, bonuses, bonuses worth nothing), from the comments on api.MapID
+SIZES = {
+    api.MapID.BANANA: (12, 4, 0),
+    api.MapID.OWL_ISLAND: (12, 4, 0),
+    api.MapID.NEW_ZEALAND_SMALL: (18, 8, 0),
+    api.MapID.TANZANIA: (19, 5, 0),
+    api.MapID.ITALY: (20, 10, 0),
+    api.MapID.ICELAND: (24, 7, 0),
+    api.MapID.BRITISH_ISLES: (25, 6, 0),
+    api.MapID.FINLAND: (31, 6, 0),
+    api.MapID.PLATEAUS: (32, 11, 0),
+    api.MapID.APPLE: (36, 13, 0),
+    api.MapID.SMALL_EARTH: (42, 6, 0),
+    api.MapID.SPQR: (45, 8, 0),
+    api.MapID.UNITED_STATES: (48, 10, 0),
+    api.MapID.MIDDLE_EAST: (50, 8, 0),
+    api.MapID.NORTH_AMERICA: (54, 9, 0),
+    api.MapID.IMPERIUM_ROMANUM: (106, 31, 0),
+    api.MapID.MEDIUM_EARTH: (129, 27, 0),
+    api.MapID.MIDDLE_EARTH: (269, 150, 61),
+    api.MapID.RISE_OF_ROME: (273, 83, 0),
+    api.MapID.AMERICAN_REVOLUTION: (500, 222, 0),
+}
+
+def synthetic_map(mapid: api.MapID, seed: int = 0) -> MapStructure:
+    """A map shaped roughly like a real one: territories joined to their nearest
+    neighbors, and bonuses made of the territories closest to each of a few centers"""
+    territories, bonuses, worthless = SIZES[mapid]
+    rng = np.random.default_rng(seed)
+    points = rng.random((territories, 2))
+    distance = np.linalg.norm(points[:, None] - points[None], axis=-1)
+    np.fill_diagonal(distance, np.inf)
+    nearest = np.argsort(distance, axis=1)[:, :min(4, territories - 1)]
+    adjacency = np.zeros((territories, territories), dtype=bool)
+    adjacency[np.repeat(np.arange(territories), nearest.shape[1]), nearest.ravel()] = True
+    adjacency |= adjacency.T
+    indptr = np.concatenate([[0], np.cumsum(adjacency.sum(axis=1))])
+    indices = np.nonzero(adjacency)[1]
+
+    # every center keeps its own territory, so no bonus comes out empty
+    centers = rng.choice(territories, bonuses, replace=False)
+    members = np.argmin(np.linalg.norm(points[:, None] - points[centers][None], axis=-1), axis=1)
+    members[centers] = np.arange(bonuses)
+    bonus_list = [
+        Bonus(f"bonus {b}", set(np.nonzero(members == b)[0].tolist()), 0 if b < worthless else max(1, int((members == b).sum()) - 1))
+        for b in range(bonuses)
+    ]
+    return MapStructure.from_arrays(
+        int(mapid),
+        mapid.name,
+        [f"territory {i}" for i in range(territories)],
+        np.arange(1, territories + 1, dtype=np.int64),
+        indptr,
+        indices,
+        bonus_list,
+    )
+
+def load(mapid: api.MapID, cache: Optional[str]) -> Tuple[MapStructure, bool]:
+    if cache is not None and mapstore.exists(cache, mapid):
+        return mapstore.load(cache, mapid), True
+    return synthetic_map(mapid), False
+
+def midgame(mapstruct: MapStructure, turns: int = 5) -> MapState:
+    """A state a few turns into a Random vs Random game"""
+    rng = np.random.default_rng(0)
+    state = engine.initial_state(mapstruct, [1, 2], rng=rng)
+    players = [Random(1, seed=1), Random(2, seed=2)]
+    for _ in range(turns):
+        state = engine.resolve_turn(state, [order for player in players for order in player(state)], rng=rng)
+    return state
+
+def benchmarks(mapstruct: MapStructure) -> Dict[str, Callable[[], object]]:
+    state = midgame(mapstruct)
+    players = [Random(1, seed=1), Random(2, seed=2)]
+    orders = [order for player in players for order in player(state)]
+    rng = np.random.default_rng(0)
+    terrs = rng.integers(len(mapstruct), size=256)
+    standing = [
+        { "terrID": mapstruct._wz_terr_id(terr), "ownedBy": "Neutral" if owner == 0 else str(owner), "armies": str(armies) }
+        for terr, (owner, armies) in enumerate(zip(state.owner.tolist(), state.armies.tolist()))
+    ]
+
+    def apply_orders():
+        copy = state.copy()
+        for order in orders:
+            order.apply(copy)
+
+    return {
+        "income": lambda: state.income(1),
+        "borders": lambda: state.borders(1),
+        "neighbors x256": lambda: [mapstruct.neighbors(terr) for terr in terrs],
+        "copy": state.copy,
+        "apply orders": apply_orders,
+        "resolve_turn": lambda: engine.resolve_turn(state, orders, rng=rng),
+        "random agent": lambda: players[0](state),
+        "_to_map_state": lambda: api._to_map_state(standing, mapstruct),
+    }
+
+def measure(fn: Callable[[], object], min_time: float) -> Dict[str, float]:
+    fn()
+    calls, start = 0, perf_counter()
+    # double the batch until it runs long enough, so the clock isn't read every call
+    batch = 1
+    while perf_counter() - start < min_time:
+        for _ in range(batch):
+            fn()
+        calls += batch
+        batch *= 2
+    ops = calls / (perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return { "ops": ops, "peak": peak }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark wzai across map sizes")
+    parser.add_argument("--maps", nargs="*", default=[mapid.name for mapid in api.MapID], help="api.MapID names, all by default")
+    parser.add_argument("--cache", help="map store to take real maps from")
+    parser.add_argument("--baseline", help="results saved by an earlier run to compare against")
+    parser.add_argument("--save-baseline", help="file to save the results to, for a later --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="slowdown allowed before failing, as a fraction")
+    parser.add_argument("--min-time", type=float, default=0.1, help="seconds to run each benchmark for")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    regressions = []
+    print(f"{'map':<20} {'T':>4}  {'benchmark':<16} {'ops/s':>12} {'peak KiB':>9} {'vs baseline':>12}")
+    for name in args.maps:
+        mapid = api.MapID[name]
+        mapstruct, real = load(mapid, args.cache)
+        results[name] = {}
+        for bench, fn in benchmarks(mapstruct).items():
+            result = results[name][bench] = measure(fn, args.min_time)
+            before = baseline.get(name, {}).get(bench)
+            ratio = result["ops"] / before["ops"] if before else None
+            if ratio is not None and ratio < 1 - args.tolerance:
+                regressions.append((name, bench, ratio))
+            label = name if real else name + "*"
+            print(f"{label:<20} {len(mapstruct):>4}  {bench:<16} {result['ops']:>12,.0f} {result['peak'] / 1024:>9.1f} {'' if ratio is None else f'{ratio:.2f}x':>12}")
+    print("* synthetic map")
+
+    if args.save_baseline is not None:
+        with open(args.save_baseline, "w") as file:
+            json.dump({ "results": results }, file, indent=1, sort_keys=True)
+        print(f"Saved the baseline to {args.save_baseline}")
+    for name, bench, ratio in regressions:
+        print(f"Regression: {bench} on {name} runs at {ratio:.2f}x the baseline")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""Turns per second of the local engine, for every api.MapID
+
+Reports engine.resolve_turn on a midgame position, engine.resolve_turns on
+a batch of 64 of them, and whole LocalGame turns of Random against Random,
+agents included. Maps are taken the way benchmarks/run.py takes them:
+
+    python benchmarks/turns.py
+    python benchmarks/turns.py --maps SMALL_EARTH --target 1000
+
+With --target, the exit status is 1 when resolve_turn runs fewer turns per
+second than that on any map.
+"""
+from typing import List, Optional
+import argparse
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from run import load, measure, midgame
+from wzai import api, engine
+from wzai.agents import Random
+from wzai.gym import LocalGame
+from wzai.types import BatchMapState
+
+BATCH = 64
+
+def self_play(mapstruct, min_time: float) -> float:
+    """Turns per second of LocalGame games between two Random agents, played until min_time is up"""
+    turns, seed, start = 0, 0, perf_counter()
+    while perf_counter() - start < min_time:
+        game = LocalGame(mapstruct, opponent=Random(2, seed=seed))
+        agent = Random(1, seed=seed + 1)
+        game.reset(seed=seed)
+        done = False
+        while not done:
+            _, _, terminated, truncated, _ = game.step(agent(game.state()))
+            done = terminated or truncated
+        turns += game.turn
+        seed += 2
+    return turns / (perf_counter() - start)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure turns per second of the local engine across map sizes")
+    parser.add_argument("--maps", nargs="*", default=[mapid.name for mapid in api.MapID], help="api.MapID names, all by default")
+    parser.add_argument("--cache", help="map store to take real maps from")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds to run each measurement for")
+    parser.add_argument("--target", type=float, help="turns per second resolve_turn must reach")
+    args = parser.parse_args(argv)
+
+    misses = []
+    print(f"{'map':<20} {'T':>4} {'orders':>7} {'resolve_turn':>13} {f'x{BATCH} batch':>13} {'self-play':>10}")
+    for name in args.maps:
+        mapstruct, real = load(api.MapID[name], args.cache)
+        state = midgame(mapstruct)
+        orders = [order for player in (Random(1, seed=1), Random(2, seed=2)) for order in player(state)]
+        batch = BatchMapState.from_states([state] * BATCH)
+        rng = np.random.default_rng(0)
+
+        single = measure(lambda: engine.resolve_turn(state, orders, rng=rng), args.min_time)["ops"]
+        batched = measure(lambda: engine.resolve_turns(batch, [orders] * BATCH, rng=rng), args.min_time)["ops"] * BATCH
+        played = self_play(mapstruct, args.min_time)
+        if args.target is not None and single < args.target:
+            misses.append((name, single))
+        label = name if real else name + "*"
+        print(f"{label:<20} {len(mapstruct):>4} {len(orders):>7} {single:>13,.0f} {batched:>13,.0f} {played:>10,.0f}")
+    print("turns per second, * synthetic map")
+
+    for name, single in misses:
+        print(f"Below target: resolve_turn on {name} runs {single:,.0f} turns/s")
+    return 1 if misses else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -21,6 +21,9 @@ setup(
             "torch-scatter",
             "torch-sparse",
             "torch-geometric",
-        ]
+        ],
+        "aio": [
+            "aiohttp",
+        ],
     },
 )
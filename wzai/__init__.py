@@ -1,9 +1,20 @@
-from . import api
-from . import gym
-from . import agents
 from .types import *
 from .orders import *
-try:
-    from . import torch
-except ImportError:
-    pass
+
+import importlib
+
+# Everything past the core types and orders loads on first access, so
+# `import wzai` needs only numpy and workers don't pay for requests,
+# networkx, gymnasium or torch unless they use them
+_SUBMODULES = {
+    "actions", "agent", "agents", "api", "dataset", "engine", "gym", "instrument", "mapstore",
+    "replay", "scheduler", "search", "server", "torch", "tournament", "utils", "vector",
+}
+
+def __getattr__(name: str):
+    if name in _SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(set(globals()) | _SUBMODULES)
@@ -0,0 +1,108 @@
+"""Fixed-size actions over the edges of a map
+
+An action is a pair of arrays, the same shape for every state of a map:
+
+    deploy  (T,) weights over territories, the player's income is split in proportion
+    attack  (E,) the fraction of each source's armies (after deploys) sent along
+                 each edge of mapstruct.edges, scaled down where a source's add up to more than 1
+
+Every function also takes a leading batch axis, and legal_masks says which
+entries can be nonzero, so a policy can mask its logits and sample valid
+orders for a whole batch at once.
+"""
+from .orders import Order, DeployOrder, AttackTransferOrder
+from .types import MapState, MapStructure, BatchMapState
+
+from typing import List, Sequence, Tuple, Union
+import numpy as np
+
+States = Union[MapState, Sequence[MapState], BatchMapState]
+
+# keeps fractions that encode() produced from flooring to one army less
+_EPS = 1e-6
+
+def legal_masks(states: States, player: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(N, T) territories the player can deploy on, (N, E) edges they can move along, (N,) their income"""
+    batch = _batch(states)
+    owned = batch.owner == batch.player_index(player)
+    return owned, owned[:, batch.mapstruct.edges[:, 0]], batch.income(batch.player_index(player))
+
+def decode(states: States, deploy: np.ndarray, attack: np.ndarray, player: int) -> List[List[Order]]:
+    """The orders for fractional actions of shapes (N, T) and (N, E), one list per state"""
+    batch = _batch(states)
+    deploy, attack = decode_counts(batch, deploy, attack, player)
+    return to_orders(batch.mapstruct, deploy, attack, batch.player_index(player))
+
+def decode_counts(states: States, deploy: np.ndarray, attack: np.ndarray, player: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Turn fractional actions into (N, T) armies deployed and (N, E) armies moved
+
+    Illegal entries are ignored. Deploys use up the whole income, rounded
+    by largest remainder, unless every legal weight is 0.
+    """
+    batch = _batch(states)
+    mapstruct = batch.mapstruct
+    n = len(batch)
+    deploy_mask, attack_mask, income = legal_masks(batch, player)
+
+    weights = np.where(deploy_mask, np.clip(np.reshape(deploy, (n, -1)), 0, None), 0.0)
+    total = weights.sum(axis=1, keepdims=True)
+    share = np.divide(weights, total, out=np.zeros_like(weights), where=total > 0) * income[:, None]
+    deploys = np.floor(share + _EPS).astype(np.int64)
+    missing = np.where(total[:, 0] > 0, income - deploys.sum(axis=1), 0)
+    # hand the leftover armies to the largest remainders
+    ranks = np.argsort(np.argsort(deploys - share, axis=1, kind="stable"), axis=1)
+    deploys += (ranks < missing[:, None]) & deploy_mask
+
+    fractions = np.where(attack_mask, np.clip(np.reshape(attack, (n, -1)), 0, None), 0.0)
+    src = mapstruct.edges[:, 0]
+    sums = np.diff(np.concatenate([np.zeros((n, 1)), np.cumsum(fractions, axis=1)], axis=1)[:, mapstruct.indptr], axis=1)
+    fractions /= np.maximum(sums, 1)[:, src]
+    available = (batch.armies + deploys)[:, src]
+    return deploys, np.floor(fractions * available + _EPS).astype(np.int64)
+
+def to_orders(mapstruct: MapStructure, deploy: np.ndarray, attack: np.ndarray, player: int) -> List[List[Order]]:
+    """Orders for (N, T) armies deployed and (N, E) armies moved"""
+    orders: List[List[Order]] = [[] for _ in range(len(deploy))]
+    for game, target in zip(*np.nonzero(deploy)):
+        orders[game].append(DeployOrder(player, int(target), int(deploy[game, target])))
+    for game, edge in zip(*np.nonzero(attack)):
+        src, dst = mapstruct.edges[edge]
+        orders[game].append(AttackTransferOrder(player, int(src), int(dst), int(attack[game, edge])))
+    return orders
+
+def encode(state: MapState, orders: Sequence[Order]) -> Tuple[np.ndarray, np.ndarray]:
+    """The (T,) and (E,) fractions that decode back to the orders' armies, for one state"""
+    deploy, attack = encode_counts(state.mapstruct, orders)
+    deploy_frac = deploy / max(deploy.sum(), 1)
+    available = (state.armies + deploy)[state.mapstruct.edges[:, 0]]
+    return deploy_frac, np.divide(attack, available, out=np.zeros(len(attack)), where=available > 0)
+
+def encode_counts(mapstruct: MapStructure, orders: Sequence[Order]) -> Tuple[np.ndarray, np.ndarray]:
+    """(T,) armies deployed and (E,) armies moved by the orders"""
+    deploys = [(order.target, order.armies) for order in orders if isinstance(order, DeployOrder)]
+    attacks = [(order.src, order.dst, order.armies) for order in orders if isinstance(order, AttackTransferOrder)]
+    deploys = np.array(deploys, dtype=np.int64).reshape(-1, 2)
+    attacks = np.array(attacks, dtype=np.int64).reshape(-1, 3)
+    return (
+        np.bincount(deploys[:, 0], deploys[:, 1], minlength=len(mapstruct)).astype(np.int64),
+        np.bincount(
+            edge_index(mapstruct, attacks[:, 0], attacks[:, 1]),
+            attacks[:, 2],
+            minlength=len(mapstruct.edges)
+        ).astype(np.int64),
+    )
+
+def edge_index(mapstruct: MapStructure, src, dst):
+    """Position of the edges src -> dst in mapstruct.edges, for scalars or arrays"""
+    keys = mapstruct.edge_keys
+    key = np.asarray(src) * len(mapstruct) + np.asarray(dst)
+    i = np.minimum(np.searchsorted(keys, key), len(keys) - 1)
+    assert (keys[i] == key).all(), "not an edge"
+    return i
+
+def _batch(states: States) -> BatchMapState:
+    if isinstance(states, BatchMapState):
+        return states
+    if isinstance(states, MapState):
+        states = [states]
+    return BatchMapState.from_states(states)
@@ -1,8 +1,8 @@
 from .orders import Order
-from .types import MapState
+from .types import MapState, BatchMapState
 from .utils import pretty_print
 
-from typing import List
+from typing import List, Optional, Sequence, Union
 
 @pretty_print("playerid")
 class Agent:
@@ -11,3 +11,13 @@ class Agent:
 
     def __call__(self, mapstate: MapState) -> List[Order]:
         raise NotImplementedError()
+
+    def seed(self, seed: Optional[int]):
+        """Restart the agent's randomness, if it has any, e.g. when a LocalGame is reset with a seed"""
+        pass
+
+    def batch_call(self, mapstates: Union[Sequence[MapState], BatchMapState]) -> List[List[Order]]:
+        """Orders for many states at once, which agents can override with a vectorized version"""
+        if isinstance(mapstates, BatchMapState):
+            mapstates = mapstates.states()
+        return [self(mapstate) for mapstate in mapstates]
@@ -1,33 +1,90 @@
 from ..agent import Agent
 from ..orders import Order, DeployOrder, AttackTransferOrder
-from ..types import MapState
-from ..utils import chain
-from .helper import collect_deploys, collect_attacks
+from ..types import MapState, MapStructure, BatchMapState
 
-from typing import List
+from typing import List, Optional, Sequence, Tuple, Union
 import numpy as np
-import random
 
 class Random(Agent):
+    """Deploys each army on a random owned territory, then sends each army to a random neighbor
+
+    Both steps are multinomial draws, sampled for a whole batch of states
+    with a fixed number of NumPy calls rather than once per army.
+    """
+    def __init__(self, playerid: int, seed: Optional[int] = None):
+        super().__init__(playerid)
+        self.rng = np.random.default_rng(seed)
+
+    def seed(self, seed: Optional[int]):
+        self.rng = np.random.default_rng(seed)
+
     def __call__(self, state: MapState) -> List[Order]:
-        deploys = self._deploys(state)
-        attacks = self._attacks(chain(*deploys)(state))
-        return [*deploys, *attacks]
-
-    def _deploys(self, state: MapState) -> List[DeployOrder]:
-        owned_territories, = np.where(state.owner == self.playerid)
-        return collect_deploys(
-                self.playerid,
-                random.choices(owned_territories.tolist(), k=state.income(self.playerid))
-        )
-    
-    def _attacks(self, state: MapState) -> List[AttackTransferOrder]:
-        owned_territories, = np.where(state.owner == self.playerid)
-        return collect_attacks(
-                self.playerid,
-                [
-                    (src, dst)
-                    for src in owned_territories
-                    for dst in random.choices(list(state.neighbors(src)), k=state.armies[src])
-                ]
+        # one state skips the batch bookkeeping, and draws a neighbor per army
+        # rather than a binomial per neighbor, which is faster at this size
+        mapstruct = state.mapstruct
+        owned = np.flatnonzero(state.owner == self.playerid)
+        if len(owned) == 0:
+            return []
+        picks = (self.rng.random(state.income(self.playerid)) * len(owned)).astype(int)
+        deploys = np.bincount(owned[picks], minlength=len(state))
+        armies = state.armies + deploys
+
+        srcs = owned[(armies[owned] > 0) & (mapstruct.degree[owned] > 0)]
+        army_srcs = np.repeat(srcs, armies[srcs])
+        slots = (self.rng.random(len(army_srcs)) * mapstruct.degree[army_srcs]).astype(int)
+        sent = np.bincount(mapstruct.indptr[army_srcs] + slots, minlength=len(mapstruct.edges))
+        moves = np.flatnonzero(sent)
+
+        orders: List[Order] = [DeployOrder(self.playerid, target, count) for target, count in zip(owned.tolist(), deploys[owned].tolist()) if count]
+        orders.extend(
+            AttackTransferOrder(self.playerid, src, dst, count)
+            for (src, dst), count in zip(mapstruct.edges[moves].tolist(), sent[moves].tolist())
         )
+        return orders
+
+    def batch_call(self, states: Union[Sequence[MapState], BatchMapState]) -> List[List[Order]]:
+        batch = states if isinstance(states, BatchMapState) else BatchMapState.from_states(states)
+        deploys = self._deploys(batch)
+        armies = batch.armies + deploys
+        games, srcs = np.nonzero((batch.owner == self.playerid) & (armies > 0))
+        stacks, dsts, sent = self._split(batch.mapstruct, srcs, armies[games, srcs])
+
+        orders: List[List[Order]] = [[] for _ in range(len(batch))]
+        for game, target in zip(*np.nonzero(deploys)):
+            orders[game].append(DeployOrder(self.playerid, target, deploys[game, target]))
+        for game, src, dst, count in zip(games[stacks].tolist(), srcs[stacks].tolist(), dsts.tolist(), sent.tolist()):
+            orders[game].append(AttackTransferOrder(self.playerid, src, dst, count))
+        return orders
+
+    def _deploys(self, batch: BatchMapState) -> np.ndarray:
+        """(N, T) armies deployed per territory"""
+        n, t = batch.owner.shape
+        games, terrs = np.nonzero(batch.owner == self.playerid)
+        owned = np.bincount(games, minlength=n)
+        income = np.where(owned > 0, batch.income(self.playerid), 0)
+
+        # every army picks one of its game's owned territories uniformly
+        draws = np.repeat(np.arange(n), income)
+        start = np.cumsum(owned) - owned
+        picks = start[draws] + (self.rng.random(len(draws)) * owned[draws]).astype(int)
+        return np.bincount(draws * t + terrs[picks], minlength=n * t).reshape(n, t)
+
+    def _split(self, mapstruct: MapStructure, srcs: np.ndarray, armies: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(stack, dst, armies) for every move, stack indexing srcs, sending each stack to random neighbors"""
+        degree = mapstruct.degree[srcs]
+        remaining = armies.copy()
+
+        # split each stack across its neighbors with a chain of binomials,
+        # one neighbor slot at a time, which is a multinomial with equal odds
+        stacks, dsts, sent = [], [], []
+        for slot in range(degree.max(initial=0)):
+            active = np.nonzero(degree > slot)[0]
+            moved = self.rng.binomial(remaining[active], 1 / (degree[active] - slot))
+            remaining[active] -= moved
+            hit = moved > 0
+            stacks.append(active[hit])
+            dsts.append(mapstruct.indices[mapstruct.indptr[srcs[active[hit]]] + slot])
+            sent.append(moved[hit])
+        if not stacks:
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp), np.zeros(0, dtype=int)
+        return np.concatenate(stacks), np.concatenate(dsts), np.concatenate(sent)
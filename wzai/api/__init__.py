@@ -0,0 +1,317 @@
+from .. import instrument
+from ..orders import Order, validate_orders
+from ..types import Bonus, MapStructure, MapState
+from ..utils import random_name
+
+from collections import Counter
+from enum import IntEnum
+from functools import lru_cache
+from typing import Union, List, Optional, Tuple, Dict, Any
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import importlib
+import json
+import os
+import numpy as np
+import requests
+
+# Point the client somewhere else (like a wzai.server) with WZAI_API_ROOT or configure(root=...)
+ROOT = os.environ.get("WZAI_API_ROOT", "http://aiserver.warzone.com/api/")
+BOT_ID = 633947
+
+# Connection pool and retry policy shared by every call, see configure()
+POOL_SIZE = 16
+RETRIES = 3
+BACKOFF = 0.5
+TIMEOUT = 30.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Endpoints that only read, the only ones retried once a request may have reached the server
+QUERY_PREFIXES = ("Get", "ExportBotGame")
+_session: Optional[requests.Session] = None
+
+# Requests made per endpoint, by both the blocking and the asyncio client
+REQUEST_COUNTS: Counter = Counter()
+
+# Latest GetGameInfo response per (game, player), dropped once orders are sent
+TURN_CACHE_SIZE = 1024
+_turn_cache: Dict[Tuple[int, int], Any] = {}
+
+Player = Union[str, int]
+
+class MapID(IntEnum):
+    # Map ids, sorted from smallest to largest
+    BANANA = 29633 # 12, 4
+    OWL_ISLAND = 56763 # 12, 4
+    NEW_ZEALAND_SMALL = 38436 # 18, 8
+    TANZANIA = 51119 # 19, 5
+    ITALY = 3448 # 20, 10
+    ICELAND = 24221 # 24, 7
+    BRITISH_ISLES = 36084 # 25, 6
+    FINLAND = 34615 # 31, 6
+    PLATEAUS = 55574 # 32, 11
+    APPLE = 32414 # 36, 13
+    SMALL_EARTH = 70306 # 42, 6
+    SPQR = 96770 # 45, 8
+    UNITED_STATES = 149 # 48, 10
+    MIDDLE_EAST = 92434 # 50, 8
+    NORTH_AMERICA = 92435 # 54, 9
+    IMPERIUM_ROMANUM = 72163 # 106, 31
+    MEDIUM_EARTH = 19785 # 129, 27
+    MIDDLE_EARTH = 96728 # 269, 150 (89 non-zero)
+    RISE_OF_ROME = 16114 # 273, 83
+    AMERICAN_REVOLUTION = 80849 # 500, 222
+
+def create_game(players: List[Player], botgame: bool = False, mapid: int = MapID.SMALL_EARTH) -> int:
+    return call(*_create_game_request(players, botgame, mapid))["gameID"]
+
+def map_structure(gameid: int, botgame: bool = False):
+    return _to_map_structure(call(*_map_structure_request(gameid, botgame))["map"])
+
+def map_state(gameid: int, mapstruct: Optional[MapStructure] = None, playerid: int = 633947, botgame: bool = False, return_turn: bool = False, compact: bool = False):
+    mapstruct = mapstruct or _cached_map_structure(gameid, botgame)
+    response = call(*_map_state_request(gameid, playerid, botgame))
+    return _parse_map_state(response, mapstruct, return_turn, compact)
+
+def turn_state(gameid: int, mapstruct: Optional[MapStructure] = None, playerid: int = 633947, botgame: bool = False, refresh: bool = False, compact: bool = False):
+    """The map state and game_info of the current turn, from a single request
+
+    The response is kept until orders are sent for the game, so asking for
+    the same turn again (or game_info(cached=True)) costs no request.
+    """
+    key = (gameid, playerid)
+    mapstruct = mapstruct or _cached_map_structure(gameid, botgame)
+    if not refresh and key in _turn_cache:
+        response = _turn_cache[key]
+        return _parse_map_state(response, mapstruct, False, compact), _parse_game_info(response)
+
+    response = call(*_map_state_request(gameid, playerid, botgame))
+    # parsed first, so a response without a standing (game not started, say) is never cached
+    state, info = _parse_map_state(response, mapstruct, False, compact), _parse_game_info(response)
+    _turn_cache.pop(key, None)
+    _turn_cache[key] = response
+    while len(_turn_cache) > TURN_CACHE_SIZE:
+        del _turn_cache[next(iter(_turn_cache))]
+    return state, info
+
+def game_info(gameid, botgame=False, cached=False):
+    if cached:
+        for (cached_gameid, _), response in _turn_cache.items():
+            if cached_gameid == gameid:
+                return _parse_game_info(response)
+    return _parse_game_info(call(*_game_info_request(gameid, botgame)))
+
+def send_orders(gameid: str, mapstruct: MapStructure, orders: List[Order], turn: int, playerid: int = 633947, botgame: bool = False, playerids: Optional[np.ndarray] = None, state: Optional[MapState] = None):
+    """Send a turn's orders, checked with validate_orders against state first when it's given"""
+    if state is not None:
+        validate_orders(state, orders)
+    _forget_turn(gameid)
+    return call(*_send_orders_request(gameid, mapstruct, orders, turn, playerid, botgame, playerids))
+
+def request_count() -> int:
+    """Total requests made since the counts were last reset, see REQUEST_COUNTS"""
+    return sum(REQUEST_COUNTS.values())
+
+@lru_cache(maxsize=64)
+def _cached_map_structure(gameid: int, botgame: bool) -> MapStructure:
+    # a game's map never changes, so it's only downloaded once
+    return map_structure(gameid, botgame=botgame)
+
+def _forget_turn(gameid: int):
+    for key in [key for key in _turn_cache if key[0] == gameid]:
+        del _turn_cache[key]
+
+def get_replay(gameid: str):
+    return call("ExportBotGame", {"gameID": gameid})["result"]
+
+def save_replay(gameid: str, location: str):
+    xml = get_replay(gameid)
+    with open(location, "w") as file:
+        file.write(xml)
+
+def call(api: str, data):
+    REQUEST_COUNTS[api] += 1
+    with instrument.span("api.call", endpoint=api) as span:
+        raw = session().post(ROOT + api, json=data, timeout=TIMEOUT)
+        if instrument.enabled():
+            span.set(request_bytes=len(raw.request.body or b""), response_bytes=len(raw.content), retries=_retries(raw))
+    response = json.loads(raw.text)
+    if "error" in response:
+        raise ServerException(response["error"])
+    return response
+
+def _retries(response: requests.Response) -> int:
+    retries = getattr(response.raw, "retries", None)
+    return len(retries.history) if retries is not None else 0
+
+def session() -> requests.Session:
+    """The keep-alive session every call goes through, created on first use"""
+    global _session
+    if _session is None:
+        # every endpoint is a POST, which urllib3 only retries when the connection
+        # couldn't be made, so queries get their own adapter that retries anything
+        retry = Retry(total=RETRIES, backoff_factor=BACKOFF, status_forcelist=RETRY_STATUSES, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+        query_adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry.new(allowed_methods=None))
+        _session = requests.Session()
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+        for prefix in QUERY_PREFIXES:
+            _session.mount(ROOT + prefix, query_adapter)
+    return _session
+
+def _idempotent(api: str) -> bool:
+    """Whether calling the endpoint twice is harmless, so it can be retried after a read error or a bad status"""
+    return api.startswith(QUERY_PREFIXES)
+
+def configure(root: Optional[str] = None, pool_size: Optional[int] = None, retries: Optional[int] = None, backoff: Optional[float] = None, timeout: Optional[float] = None):
+    """Change the server or the pooling/retry settings, which takes effect with a fresh session"""
+    global ROOT, POOL_SIZE, RETRIES, BACKOFF, TIMEOUT, _session
+    if root is not None and root != ROOT:
+        # game ids are only unique per server
+        _cached_map_structure.cache_clear()
+        _turn_cache.clear()
+    ROOT = ROOT if root is None else root
+    POOL_SIZE = POOL_SIZE if pool_size is None else pool_size
+    RETRIES = RETRIES if retries is None else retries
+    BACKOFF = BACKOFF if backoff is None else backoff
+    TIMEOUT = TIMEOUT if timeout is None else timeout
+    if _session is not None:
+        _session.close()
+    _session = None
+
+# Each endpoint is split into building the request and parsing the response,
+# so the blocking functions above and the asyncio client in aio share them.
+Request = Tuple[str, Dict[str, Any]]
+
+def _create_game_request(players: List[Player], botgame: bool, mapid: int) -> Request:
+    return (
+        "CreateBotGame" if botgame else "CreateGame",
+        {
+            "gameName": random_name(),
+            "players": [
+                { "token": _handle_token(player) }
+                for player in players
+            ],
+            "settings": {
+                "Fog": "NoFog",
+                "MaxCardsHold": 999,
+                "ReinforcementCard": "none",
+                "OrderPriorityCard": "none",
+                "OrderDelayCard": "none",
+                "BlockadeCard": "none",
+                "AutomaticTerritoryDistribution": "Automatic",
+                "OneArmyStandsGuard": False,
+                "TerritoryLimit": 2,
+                "InitialPlayerArmiesPerTerritory": 2,
+                "Wastelands": {
+                    "NumberOfWastelands": 0,
+                    "WastelandSize": 10,
+                },
+                "Map": mapid,
+            }
+        }
+    )
+
+def _map_structure_request(gameid: int, botgame: bool) -> Request:
+    return "GetBotGameSettings" if botgame else "GetGameSettings", {"gameID": gameid}
+
+def _map_state_request(gameid: int, playerid: int, botgame: bool) -> Request:
+    return (
+        "GetBotGameInfo" if botgame else "GetGameInfo",
+        {
+            "gameID": gameid,
+            "playerID": playerid
+        }
+    )
+
+def _game_info_request(gameid: int, botgame: bool) -> Request:
+    return "GetBotGameInfo" if botgame else "GetGameInfo", {"gameID": gameid}
+
+def _send_orders_request(gameid: str, mapstruct: MapStructure, orders: List[Order], turn: int, playerid: int, botgame: bool, playerids: Optional[np.ndarray] = None) -> Request:
+    return (
+        "SendOrdersBotGame" if botgame else "SendOrders",
+        {
+            "gameID": gameid,
+            "turnNumber": turn,
+            "orders": [ order._encode(mapstruct, playerids) for order in orders],
+            "playerID": playerid
+        }
+    )
+
+def _parse_map_state(response, mapstruct: MapStructure, return_turn: bool, compact: bool = False):
+    if isinstance(response["gameInfo"], str):
+        raise ServerException(response["gameInfo"])
+
+    standing = response["gameInfo"]["latestStanding"]
+    # every player of the game gets an index, so they don't shift as players are eliminated
+    playerids = [int(player["id"]) for player in response["game"]["players"]] if compact else None
+    if return_turn:
+        return _to_map_state(standing, mapstruct, playerids), int(response["game"]["numberOfTurns"])+1
+    else:
+        return _to_map_state(standing, mapstruct, playerids)
+
+def _parse_game_info(response):
+    return {
+        "turn": int(response["game"]["numberOfTurns"])+1,
+        "players": {
+            player["id"]: {
+                "state": player["state"],
+                "hasCommittedOrders": player["hasCommittedOrders"] == "True"
+            }
+            for player in response["game"]["players"]
+        },
+        "state": response["game"]["state"]
+    }
+
+def _handle_token(token: Player):
+    if isinstance(token, int):
+        return f"00{token}00"
+    else:
+        return token
+
+def _to_map_structure(data) -> MapStructure:
+    import networkx as nx
+    g = nx.Graph()
+
+    old_id_to_new_id = {}
+    for i, src in enumerate(data["territories"]):
+        g.add_node(i, name=src["name"], old_id=int(src["id"]))
+        old_id_to_new_id[int(src["id"])] = i
+
+    for i, src in enumerate(data["territories"]):
+        for dst in src["connectedTo"]:
+            g.add_edge(i, old_id_to_new_id[dst])
+
+    bonuses = []
+    for bonus_data in data["bonuses"]:
+        bonuses.append(Bonus(
+            bonus_data["name"],
+            { old_id_to_new_id[i] for i in bonus_data["territoryIDs"] },
+            int(bonus_data["value"])
+        ))
+
+    return MapStructure(int(data["id"]), data["name"], g, bonuses)
+
+def _to_map_state(data, mapstruct: MapStructure, playerids: Optional[List[int]] = None) -> MapState:
+    assert len(mapstruct) == len(data)
+    data_dict = {terr["terrID"]: terr for terr in data}
+    data = [data_dict[mapstruct._wz_terr_id(i)] for i in range(len(data))]
+    state = MapState(
+            np.array([int(terr["armies"]) for terr in data], dtype=np.int32),
+            np.array([_parse_owner(terr["ownedBy"]) for terr in data]),
+            mapstruct
+    )
+    return state if playerids is None else state.compact(playerids)
+
+def _parse_owner(owner: str) -> int:
+    if owner == "Neutral":
+        return 0
+    return int(owner)
+
+class ServerException(Exception): pass
+
+def __getattr__(name: str):
+    # the asyncio client (and aiohttp) loads on first use of api.aio
+    if name == "aio":
+        return importlib.import_module(".aio", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
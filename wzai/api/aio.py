@@ -0,0 +1,99 @@
+from . import (
+    ServerException, Player, MapID,
+    _create_game_request, _map_structure_request, _map_state_request, _game_info_request, _send_orders_request,
+    _parse_map_state, _parse_game_info, _to_map_structure,
+)
+from .. import api
+from .. import instrument
+from ..orders import Order, validate_orders
+from ..types import MapState, MapStructure
+
+from typing import List, Optional
+import aiohttp
+import asyncio
+import json
+import numpy as np
+
+class Client:
+    """asyncio counterpart of the wzai.api functions, sharing one pooled connector
+
+    Use it as an async context manager so the connections are closed:
+
+        async with Client(limit=50) as client:
+            states = await asyncio.gather(*(client.map_state(gameid, mapstruct, botgame=True) for gameid in games))
+
+    Queries are retried with exponential backoff after connection errors,
+    timeouts and the statuses in api.RETRY_STATUSES. Creating games and
+    sending orders are only retried when the connection couldn't be made,
+    so they never happen twice. Server-reported errors are not retried.
+    """
+    def __init__(
+            self,
+            root: Optional[str] = None,
+            limit: int = 64,
+            timeout: Optional[float] = None,
+            retries: Optional[int] = None,
+            backoff: Optional[float] = None):
+        self.root = root
+        self.limit = limit
+        self.timeout = api.TIMEOUT if timeout is None else timeout
+        self.retries = api.RETRIES if retries is None else retries
+        self.backoff = api.BACKOFF if backoff is None else backoff
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "Client":
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.limit),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def call(self, endpoint: str, data):
+        url = (self.root or api.ROOT) + endpoint
+        idempotent = api._idempotent(endpoint)
+        api.REQUEST_COUNTS[endpoint] += 1
+        with instrument.span("api.call", endpoint=endpoint) as span:
+            for attempt in range(self.retries + 1):
+                try:
+                    async with self._session.post(url, json=data) as response:
+                        if idempotent and response.status in api.RETRY_STATUSES:
+                            raise aiohttp.ClientResponseError(response.request_info, response.history, status=response.status)
+                        text = await response.text()
+                        break
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if attempt == self.retries or not (idempotent or isinstance(e, aiohttp.ClientConnectorError)):
+                        raise
+                    await asyncio.sleep(self.backoff * 2 ** attempt)
+            if instrument.enabled():
+                span.set(request_bytes=len(json.dumps(data)), response_bytes=len(text), retries=attempt)
+        response = json.loads(text)
+        if "error" in response:
+            raise ServerException(response["error"])
+        return response
+
+    async def create_game(self, players: List[Player], botgame: bool = False, mapid: int = MapID.SMALL_EARTH) -> int:
+        return (await self.call(*_create_game_request(players, botgame, mapid)))["gameID"]
+
+    async def map_structure(self, gameid: int, botgame: bool = False) -> MapStructure:
+        return _to_map_structure((await self.call(*_map_structure_request(gameid, botgame)))["map"])
+
+    async def map_state(self, gameid: int, mapstruct: Optional[MapStructure] = None, playerid: int = 633947, botgame: bool = False, return_turn: bool = False, compact: bool = False):
+        mapstruct = mapstruct or await self.map_structure(gameid, botgame=botgame)
+        response = await self.call(*_map_state_request(gameid, playerid, botgame))
+        return _parse_map_state(response, mapstruct, return_turn, compact)
+
+    async def game_info(self, gameid: int, botgame: bool = False):
+        return _parse_game_info(await self.call(*_game_info_request(gameid, botgame)))
+
+    async def send_orders(self, gameid: str, mapstruct: MapStructure, orders: List[Order], turn: int, playerid: int = 633947, botgame: bool = False, playerids: Optional[np.ndarray] = None, state: Optional[MapState] = None):
+        if state is not None:
+            validate_orders(state, orders)
+        return await self.call(*_send_orders_request(gameid, mapstruct, orders, turn, playerid, botgame, playerids))
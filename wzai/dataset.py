@@ -0,0 +1,162 @@
+"""Columnar trajectory dataset, written in npz shards with a json index
+
+Every row is one turn of one game. Per shard:
+
+    game, turn            (n,) which game and turn the row is
+    armies, owner         (n, T) the state at the start of the turn
+    order_offsets         (n + 1,) the row's orders are order_offsets[i]:order_offsets[i + 1]
+    order_kind            (m,) DEPLOY or ATTACK_TRANSFER
+    order_player, order_src, order_dst, order_armies
+                          (m,) deploys use src for their target and -1 for dst
+
+index.json lists the shards with their row counts, so readers can stream a
+dataset shard by shard and skip to any row without opening the others.
+"""
+from .orders import Order, DeployOrder, AttackTransferOrder
+from .replay import iter_replay
+from .types import MapState, MapStructure
+
+from typing import IO, Dict, Iterator, List, Optional, Tuple, Union
+import json
+import os
+import numpy as np
+
+FORMAT_VERSION = 1
+DEPLOY = 0
+ATTACK_TRANSFER = 1
+
+class TrajectoryWriter:
+    """Append turns from any number of games, flushing a shard every shard_size rows
+
+        with TrajectoryWriter("data/", mapstruct) as writer:
+            for gameid, xml in replays:
+                writer.add_replay(io.StringIO(xml), gameid)
+    """
+    def __init__(self, directory: str, mapstruct: MapStructure, shard_size: int = 1 << 16):
+        self.directory = directory
+        self.mapstruct = mapstruct
+        self.shard_size = shard_size
+        os.makedirs(directory, exist_ok=True)
+        self.index = _read_index(directory) or {
+            "version": FORMAT_VERSION,
+            "mapid": int(mapstruct.mapid),
+            "territories": len(mapstruct),
+            "rows": 0,
+            "shards": [],
+        }
+        assert self.index["version"] == FORMAT_VERSION and self.index["mapid"] == int(mapstruct.mapid)
+        self._clear()
+
+    def __enter__(self) -> "TrajectoryWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, game: int, turn: int, state: MapState, orders: List[Order]):
+        self._game.append(game)
+        self._turn.append(turn)
+        self._armies.append(state.armies)
+        self._owner.append(state.owner if state.playerids is None else state.playerids[state.owner])
+        # orders for a compact state carry player indices, stored as real ids like the owners
+        for order in orders:
+            if isinstance(order, DeployOrder):
+                self._orders.append((DEPLOY, order._playerid(state.playerids), order.target, -1, order.armies))
+            elif isinstance(order, AttackTransferOrder):
+                self._orders.append((ATTACK_TRANSFER, order._playerid(state.playerids), order.src, order.dst, order.armies))
+        self._offsets.append(len(self._orders))
+        if len(self._game) >= self.shard_size:
+            self.flush()
+
+    def add_replay(self, source: Union[str, IO], game: int) -> int:
+        """Stream a replay into the dataset and return how many turns it had"""
+        turns = 0
+        for turns, (state, orders) in enumerate(iter_replay(source, self.mapstruct), start=1):
+            self.append(game, turns, state, orders)
+        return turns
+
+    def flush(self):
+        if not self._game:
+            return
+        orders = np.array(self._orders, dtype=np.int64).reshape(-1, 5)
+        filename = f"shard-{len(self.index['shards']):05d}.npz"
+        np.savez(
+            os.path.join(self.directory, filename),
+            game=np.array(self._game, dtype=np.int64),
+            turn=np.array(self._turn, dtype=np.int32),
+            armies=np.stack(self._armies).astype(np.int32),
+            owner=np.stack(self._owner).astype(np.int64),
+            order_offsets=np.array(self._offsets, dtype=np.int64),
+            order_kind=orders[:, 0].astype(np.uint8),
+            order_player=orders[:, 1],
+            order_src=orders[:, 2].astype(np.int32),
+            order_dst=orders[:, 3].astype(np.int32),
+            order_armies=orders[:, 4].astype(np.int32),
+        )
+        self.index["shards"].append({ "file": filename, "rows": len(self._game) })
+        self.index["rows"] += len(self._game)
+        _write_index(self.directory, self.index)
+        self._clear()
+
+    def close(self):
+        self.flush()
+
+    def _clear(self):
+        self._game: List[int] = []
+        self._turn: List[int] = []
+        self._armies: List[np.ndarray] = []
+        self._owner: List[np.ndarray] = []
+        self._orders: List[Tuple[int, int, int, int, int]] = []
+        self._offsets: List[int] = [0]
+
+class TrajectoryDataset:
+    """Read side of TrajectoryWriter, loading one shard at a time"""
+    def __init__(self, directory: str, mapstruct: Optional[MapStructure] = None):
+        self.directory = directory
+        self.mapstruct = mapstruct
+        self.index = _read_index(directory)
+        assert self.index is not None and self.index["version"] == FORMAT_VERSION
+
+    def __len__(self) -> int:
+        return self.index["rows"]
+
+    def shards(self) -> Iterator[Dict[str, np.ndarray]]:
+        """Every shard as a dict of columns"""
+        for shard in self.index["shards"]:
+            with np.load(os.path.join(self.directory, shard["file"])) as data:
+                yield dict(data)
+
+    def turns(self) -> Iterator[Tuple[MapState, List[Order]]]:
+        """Rebuild (state, orders) per row, for code that wants objects rather than columns"""
+        assert self.mapstruct is not None
+        for shard in self.shards():
+            offsets = shard["order_offsets"]
+            for row in range(len(shard["game"])):
+                state = MapState(shard["armies"][row], shard["owner"][row], self.mapstruct)
+                yield state, [
+                    _order(shard, i)
+                    for i in range(offsets[row], offsets[row + 1])
+                ]
+
+def _order(shard: Dict[str, np.ndarray], i: int) -> Order:
+    if shard["order_kind"][i] == DEPLOY:
+        return DeployOrder(int(shard["order_player"][i]), int(shard["order_src"][i]), int(shard["order_armies"][i]))
+    return AttackTransferOrder(
+        int(shard["order_player"][i]),
+        int(shard["order_src"][i]),
+        int(shard["order_dst"][i]),
+        int(shard["order_armies"][i])
+    )
+
+def _read_index(directory: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(directory, "index.json")) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+def _write_index(directory: str, index: dict):
+    tmp = os.path.join(directory, "index.json.tmp")
+    with open(tmp, "w") as file:
+        json.dump(index, file)
+    os.replace(tmp, os.path.join(directory, "index.json"))
@@ -0,0 +1,232 @@
+from .orders import Order, DeployOrder, AttackTransferOrder, _attack_arrays, _attack_problems, _deploy_arrays, _deploy_problems
+from .types import MapState, MapStructure, BatchMapState
+
+from typing import List, Optional, Sequence, Dict, Tuple, Union
+import numpy as np
+
+# orders per wave below which resolve_attacks runs orders one by one rather than in waves
+WAVE_WIDTH = 16
+
+def initial_state(
+        mapstruct: MapStructure,
+        players: Sequence[int],
+        territories_per_player: int = 2,
+        armies_per_territory: int = 2,
+        neutral_armies: int = 2,
+        rng: Optional[np.random.Generator] = None) -> MapState:
+    """Distribute starting territories the way the server's automatic distribution does"""
+    rng = rng if rng is not None else np.random.default_rng()
+    armies = np.full(len(mapstruct), neutral_armies, dtype=np.int32)
+    owner = np.zeros(len(mapstruct), dtype=int)
+    picks = rng.permutation(len(mapstruct))[:territories_per_player * len(players)]
+    for i, player in enumerate(players):
+        terrs = picks[i * territories_per_player:(i + 1) * territories_per_player]
+        owner[terrs] = player
+        armies[terrs] = armies_per_territory
+    return MapState(armies, owner, mapstruct)
+
+def resolve_turn(state: MapState, orders: List[Order], rng: Optional[np.random.Generator] = None, inplace: bool = False) -> MapState:
+    """Resolve one turn for every player at once
+
+    Orders run in priority order, so all deploys happen before any attacks.
+    Within a priority the players' orders are interleaved one at a time,
+    with the move order of the players shuffled every turn. Orders the
+    server would reject (deploying on someone else's territory or above
+    income, moving between territories that don't border) are dropped.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    if not inplace:
+        state = state.copy()
+
+    incomes = _deploy_budgets(state, orders)
+    scheduled = schedule(orders, rng)
+    attacks: List[AttackTransferOrder] = []
+    for order, legal in zip(scheduled, _legal(state, scheduled, incomes)):
+        if not legal:
+            continue
+        if isinstance(order, AttackTransferOrder):
+            attacks.append(order)
+        else:
+            order.apply(state)
+
+    if attacks:
+        player, src, dst, armies = _attack_arrays(attacks)
+        resolve_attacks(state, src, dst, armies, player)
+    return state
+
+def resolve_turns(batch: BatchMapState, orders: Sequence[List[Order]], rng: Optional[np.random.Generator] = None, inplace: bool = False) -> BatchMapState:
+    """resolve_turn for every game of a batch, with all the attacks going through one resolve_attacks call"""
+    rng = rng if rng is not None else np.random.default_rng()
+    if not inplace:
+        batch = batch.copy()
+
+    attacks: List[Tuple[int, AttackTransferOrder]] = []
+    for game, (state, game_orders) in enumerate(zip(batch.states(), orders)):
+        incomes = _deploy_budgets(state, game_orders)
+        scheduled = schedule(game_orders, rng)
+        for order, legal in zip(scheduled, _legal(state, scheduled, incomes)):
+            if not legal:
+                continue
+            if isinstance(order, AttackTransferOrder):
+                attacks.append((game, order))
+            else:
+                order.apply(state)
+
+    if attacks:
+        games, attacks = zip(*attacks)
+        player, src, dst, armies = _attack_arrays(attacks)
+        resolve_attacks(batch, src, dst, armies, player, game=np.array(games))
+    return batch
+
+def schedule(orders: List[Order], rng: np.random.Generator) -> List[Order]:
+    """The order the server executes a turn's orders in"""
+    if not orders:
+        return []
+    priority = np.array([order.priority() for order in orders])
+    player = np.array([order.player for order in orders])
+    # group by (priority, player), keeping each player's orders in the order given
+    grouped = np.lexsort((player, priority))
+    key = np.stack([priority[grouped], player[grouped]])
+    starts = np.flatnonzero(np.concatenate([[True], (key[:, 1:] != key[:, :-1]).any(axis=0)]))
+    sizes = np.diff(np.append(starts, len(orders)))
+    rank = np.arange(len(orders)) - np.repeat(starts, sizes)
+
+    # shuffle the players of every priority, then take one order per player at a time
+    seat = np.empty(len(starts), dtype=np.intp)
+    first = grouped[starts]
+    for p in np.unique(priority[first]):
+        # queues start out in order of each player's first order, as they always have
+        groups = np.flatnonzero(priority[first] == p)
+        groups = groups[np.argsort(first[groups])]
+        queues = list(range(len(groups)))
+        rng.shuffle(queues)
+        seat[groups[queues]] = np.arange(len(groups))
+    order = np.lexsort((np.repeat(seat, sizes), rank, priority[grouped]))
+    return [orders[i] for i in grouped[order].tolist()]
+
+def resolve_attacks(
+        state: Union[MapState, BatchMapState],
+        src: np.ndarray,
+        dst: np.ndarray,
+        armies: np.ndarray,
+        player: np.ndarray,
+        game: Optional[np.ndarray] = None) -> Union[MapState, BatchMapState]:
+    """Execute attack/transfer orders given as arrays, in place and in the order given
+
+    Orders are split into waves where no two orders touch the same territory
+    (of the same game, for a batch, where game gives each order's game).
+    Orders that share a territory land in different waves in their original
+    order, so the result is exactly that of executing them one by one, and
+    each wave is resolved with vectorized combat arithmetic. When the waves
+    would be too narrow for that to pay off, the orders run one by one on
+    plain ints instead.
+    """
+    n = len(state.mapstruct)
+    offset = 0 if game is None else np.asarray(game) * n
+    flat_src = np.asarray(src, dtype=np.intp) + offset
+    flat_dst = np.asarray(dst, dtype=np.intp) + offset
+    armies = np.asarray(armies)
+    player = np.asarray(player)
+
+    # the wave of an order is one past the last wave touching either of its territories
+    last = [0] * (n if game is None else n * (int(np.max(game, initial=0)) + 1))
+    waves = []
+    for a, b in zip(flat_src.tolist(), flat_dst.tolist()):
+        wave = (last[a] if last[a] > last[b] else last[b]) + 1
+        last[a] = last[b] = wave
+        waves.append(wave)
+
+    # views like batch[::2] aren't contiguous, so they are worked on as a copy and written back
+    state_armies = np.ascontiguousarray(state.armies).reshape(-1)
+    state_owner = np.ascontiguousarray(state.owner).reshape(-1)
+    if len(waves) <= WAVE_WIDTH * max(waves, default=0):
+        _execute_serial(state_armies, state_owner, flat_src, flat_dst, armies, player)
+    else:
+        waves = np.array(waves, dtype=np.intp)
+        order = np.argsort(waves, kind="stable")
+        bounds = np.searchsorted(waves[order], np.arange(1, waves.max() + 2))
+        flat_src, flat_dst, armies, player = flat_src[order], flat_dst[order], armies[order], player[order]
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            _execute_wave(state_armies, state_owner, flat_src[lo:hi], flat_dst[lo:hi], armies[lo:hi], player[lo:hi])
+    if not np.shares_memory(state_armies, state.armies):
+        state.armies[...] = state_armies.reshape(state.armies.shape)
+    if not np.shares_memory(state_owner, state.owner):
+        state.owner[...] = state_owner.reshape(state.owner.shape)
+
+    if isinstance(state, MapState) and state._tracker is not None:
+        state.track()
+    return state
+
+def combat(attack: np.ndarray, defend: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """AttackTransferOrder.combat over arrays"""
+    return np.floor(attack - defend * 0.7 + 0.5).astype(int), np.floor(defend - attack * 0.6 + 0.5).astype(int)
+
+def _execute_wave(armies: np.ndarray, owner: np.ndarray, src: np.ndarray, dst: np.ndarray, count: np.ndarray, player: np.ndarray):
+    # mirrors AttackTransferOrder._execute, for orders that touch disjoint territories
+    owned = owner[src] == player
+    src, dst, count, player = src[owned], dst[owned], count[owned], player[owned]
+    attack = np.minimum(count, armies[src])
+    defend = armies[dst]
+    transfer = owner[dst] == player
+    attack_survive, defend_survive = combat(attack, defend)
+    win = ~transfer & (attack_survive > 0) & (defend_survive <= 0)
+
+    armies[src] -= np.where(transfer | win, attack, attack - np.maximum(attack_survive, 0))
+    armies[dst] = np.where(transfer, defend + attack, np.where(win, attack_survive, np.maximum(defend_survive, 0)))
+    owner[dst[win]] = player[win]
+
+def _execute_serial(armies: np.ndarray, owner: np.ndarray, src: np.ndarray, dst: np.ndarray, count: np.ndarray, player: np.ndarray):
+    # AttackTransferOrder._execute on plain ints, reading and writing the touched territories once
+    src, dst = src.tolist(), dst.tolist()
+    terrs = list({ *src, *dst })
+    terr_armies = dict(zip(terrs, armies[terrs].tolist()))
+    terr_owner = dict(zip(terrs, owner[terrs].tolist()))
+    for s, d, c, p in zip(src, dst, count.tolist(), player.tolist()):
+        if terr_owner[s] != p:
+            continue
+        attack = min(c, terr_armies[s])
+        if terr_owner[d] == p:
+            terr_armies[s] -= attack
+            terr_armies[d] += attack
+            continue
+        attack_survive, defend_survive = AttackTransferOrder.combat(attack, terr_armies[d])
+        if attack_survive > 0 and defend_survive <= 0:
+            terr_armies[s] -= attack
+            terr_armies[d] = attack_survive
+            terr_owner[d] = p
+        else:
+            terr_armies[s] -= attack - max(attack_survive, 0)
+            terr_armies[d] = max(defend_survive, 0)
+    armies[terrs] = [terr_armies[terr] for terr in terrs]
+    owner[terrs] = [terr_owner[terr] for terr in terrs]
+
+def _deploy_budgets(state: MapState, orders: List[Order]) -> Dict[int, int]:
+    return state.incomes(list({
+        order.player
+        for order in orders
+        if isinstance(order, DeployOrder)
+    }))
+
+def _legal(state: MapState, orders: List[Order], incomes: Dict[int, int]) -> List[bool]:
+    """Which of the scheduled orders the server would carry out, by the checks validate_orders makes
+
+    Deploys spend incomes in the order they run, and one that doesn't fit
+    what is left is dropped. Whether an attack's source is still owned is
+    left to the moment it executes.
+    """
+    legal = [True] * len(orders)
+    deploys = [i for i, order in enumerate(orders) if isinstance(order, DeployOrder)]
+    if deploys:
+        player, target, armies = _deploy_arrays([orders[i] for i in deploys])
+        fine = ~np.any([bad for _, bad in _deploy_problems(state, player, target, armies)], axis=0)
+        for i, p, count, ok in zip(deploys, player.tolist(), armies.tolist(), fine.tolist()):
+            if ok and count <= incomes[p]:
+                incomes[p] -= count
+            else:
+                legal[i] = False
+    attacks = [i for i, order in enumerate(orders) if isinstance(order, AttackTransferOrder)]
+    if attacks:
+        problems = _attack_problems(state, *_attack_arrays([orders[i] for i in attacks]), owned=False)
+        for i, ok in zip(attacks, (~np.any([bad for _, bad in problems], axis=0)).tolist()):
+            legal[i] = ok
+    return legal
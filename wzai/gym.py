@@ -1,56 +1,116 @@
+from . import actions
 from . import api
+from . import engine
+from . import instrument
 from .agent import Agent
+from .agents import Random
 from .orders import Order
-from .types import MapState
-from .utils import first
+from .types import MapState, MapStructure
+from .utils import first, load_mapstruct
 
 from time import time, sleep
-from typing import Optional, Tuple, Any, List
+from typing import Optional, Tuple, Any, List, Dict, Union
+from gymnasium import spaces
 import gymnasium as gym
+import numpy as np
 
 StepResult = Tuple[Any, float, bool, bool, Any]
+Action = Union[List[Order], Dict[str, np.ndarray]]
+
+MAX_ARMIES = np.iinfo(np.int32).max
+
+def observation_space(mapstruct: MapStructure) -> spaces.Dict:
+    """Armies and owner of every territory, the arrays of a MapState"""
+    return spaces.Dict({
+        "armies": spaces.Box(0, MAX_ARMIES, (len(mapstruct),), np.int32),
+        "owner": spaces.Box(0, np.iinfo(np.int64).max, (len(mapstruct),), np.int64),
+    })
+
+def action_space(mapstruct: MapStructure) -> spaces.Dict:
+    """Armies deployed on every territory and moved along every edge of mapstruct.edges"""
+    return spaces.Dict({
+        "deploy": spaces.Box(0, MAX_ARMIES, (len(mapstruct),), np.int64),
+        "attack": spaces.Box(0, MAX_ARMIES, (len(mapstruct.edges),), np.int64),
+    })
+
+def decode_action(mapstruct: MapStructure, action: Dict[str, np.ndarray], playerid: int) -> List[Order]:
+    return actions.to_orders(mapstruct, np.asarray(action["deploy"])[None], np.asarray(action["attack"])[None], playerid)[0]
+
+def to_observation(mapstate: MapState) -> Dict[str, np.ndarray]:
+    """The observation_space form of mapstate, in arrays of its own"""
+    return { "armies": mapstate.armies.astype(np.int32), "owner": mapstate.owner.astype(np.int64) }
 
 class Game(gym.Env):
+    """reset and step return to_observation dicts, state() is the same position as a MapState for agents"""
     mapstate: MapState
+    mapstruct: MapStructure
+    playerid: int
     turn: int
-    def reset(self, seed, options): super().reset()
+    def reset(self, seed=None, options=None): super().reset(seed=seed)
     def step(self, action): raise NotImplementedError()
     def info(self): return { "turn": self.turn }
+    def state(self) -> MapState: return self.mapstate
+
+    def _observation(self) -> Optional[Dict[str, np.ndarray]]:
+        return None if self.mapstate is None else to_observation(self.state())
+
+    def _set_spaces(self):
+        self.observation_space = observation_space(self.mapstruct)
+        self.action_space = action_space(self.mapstruct)
+
+    def _orders(self, action: Action) -> List[Order]:
+        if isinstance(action, dict):
+            return decode_action(self.mapstruct, action, self.playerid)
+        return action
 
-    def play(self, agent: Agent, seed=None, options={}):
-        state, info = self.reset(seed, options)
+    def play(self, agent: Agent, seed=None, options={}, display: bool = True):
+        """Play a game out, printing every turn unless display is False, e.g. when an instrument sink is recording instead"""
+        self.reset(seed, options)
         reward = 0
         done = False
         while not done:
-            self.display()
-            state, reward, terminated, truncated, info = self.step(agent(state))
+            if display:
+                self.display()
+            with instrument.span("agent", agent=type(agent).__name__, turn=self.turn):
+                orders = agent(self.state())
+            with instrument.span("env.step", env=type(self).__name__, turn=self.turn):
+                _, reward, terminated, truncated, info = self.step(orders)
             done = terminated or truncated
         return reward
 
 class BotGame(Game):
+    playerid = 1
+
     def __init__(self):
         self.reset()
 
-    def reset(self, seed=None, options={}):
+    def reset(self, seed=None, options=None):
         super().reset(seed=seed, options=options)
+        options = options or {}
         self.turn = 0
         self.mapid = options.get("mapid", api.MapID.SMALL_EARTH)
+        self.compact = options.get("compact", False)
         self.gameid = api.create_game([1, "AI@warlight.net"], botgame=True, mapid=self.mapid)
         self.mapstruct = api.map_structure(self.gameid, botgame=True)
-        self.mapstate = api.map_state(self.gameid, mapstruct=self.mapstruct, playerid=1, botgame=True)
-        return self.mapstate, self.info()
+        self._set_spaces()
+        self.mapstate, _ = api.turn_state(self.gameid, mapstruct=self.mapstruct, playerid=1, botgame=True, compact=self.compact)
+        return self._observation(), self.info()
 
-    def step(self, action: List[Order]) -> StepResult:
-        api.send_orders(self.gameid, self.mapstruct, orders=action, turn=self.turn + 1, playerid=1, botgame=True)
-        self.mapstate = api.map_state(self.gameid, self.mapstruct, playerid=1, botgame=True)
+    def step(self, action: Action) -> StepResult:
+        with instrument.span("env.send_orders"):
+            api.send_orders(self.gameid, self.mapstruct, orders=self._orders(action), turn=self.turn + 1, playerid=1, botgame=True, playerids=self.mapstate.playerids, state=self.mapstate)
+        with instrument.span("env.fetch_state"):
+            # also caches this turn's game info for winner()
+            self.mapstate, _ = api.turn_state(self.gameid, self.mapstruct, playerid=1, botgame=True, compact=self.compact)
 
         self.turn += 1
-        winner = self.winner()
+        with instrument.span("env.winner"):
+            winner = self.winner()
 
-        return self.mapstate, 1 if winner == 1 else -1 if winner == 2 else 0, winner is not None, False, self.info()
+        return self._observation(), 1 if winner == 1 else -1 if winner == 2 else 0, winner is not None, False, self.info()
 
     def winner(self) -> Optional[int]:
-        info = api.game_info(self.gameid, botgame=True)
+        info = api.game_info(self.gameid, botgame=True, cached=True)
         players = [
                 player
                 for player, player_info in info["players"].items()
@@ -65,11 +125,17 @@ class BotGame(Game):
         print(f"Turn {self.turn}:")
         print(f"  Territories: {(self.mapstate.owner == 1).sum()} : {(self.mapstate.owner == 2).sum()}")
         print(f"  Armies: {self.mapstate.armies[self.mapstate.owner == 1].sum()} : {self.mapstate.armies[self.mapstate.owner == 2].sum()}")
-        print(f"  Income: {self.mapstate.income(1)} : {self.mapstate.income(2)}")
+        incomes = self.mapstate.incomes([1, 2])
+        print(f"  Income: {incomes[1]} : {incomes[2]}")
 
 class PlayerGame(Game):
-    def reset(self, seed=None, options={}):
+    @property
+    def playerid(self) -> int:
+        return self.p1
+
+    def reset(self, seed=None, options=None):
         super().reset(seed=seed, options=options)
+        options = options or {}
         self.turn = 0
         self.mapid = options.get("mapid", api.MapID.SMALL_EARTH)
         if options.get("resume") is None:
@@ -81,32 +147,69 @@ class PlayerGame(Game):
             print(f"Resuming game: https://www.warzone.com/MultiPlayer?GameID={self.gameid}")
             self.turn = info["turn"] - 1
         self.mapstruct = api.map_structure(self.gameid, botgame=False)
+        self._set_spaces()
         self.p1 = api.BOT_ID
-        self.mapstate = self.get_mapstate_blocking()
-        self.p2 = first(p for p in self.mapstate.owner if p not in { self.p1, 0 })
-        return self.mapstate, self.info()
+        self.p2 = None
+        self.mapstate = None
+        if options.get("wait", True):
+            self.observe(self.get_mapstate_blocking())
+        # no observation until the first turn has been waited for
+        return self._observation(), self.info()
 
-    def get_mapstate_blocking(self, timeout=60, delay=5):
-        start = time()
-        while time() - start < timeout:
-            sleep(delay)
+    def get_mapstate_blocking(self, timeout=60, delay=0.5, max_delay=5):
+        """The state once our next turn has started (or the game ended), polling with exponential backoff"""
+        deadline = time() + timeout
+        while True:
             try:
-                return api.map_state(self.gameid, mapstruct=self.mapstruct, playerid=self.p1, botgame=False)
+                # one request gives both the standing and whether it's our move yet
+                mapstate, info = api.turn_state(self.gameid, mapstruct=self.mapstruct, playerid=self.p1, botgame=False, refresh=True)
+                if self.ready(info) or info["state"] == "Finished":
+                    return mapstate
             except api.ServerException:
-                print(f"Waiting on player's turn {self.turn}")
+                pass
+            if time() + delay > deadline:
+                raise TimeoutError(f"Player didn't finish turn {self.turn} of game {self.gameid} within {timeout}s")
+            print(f"Waiting on player's turn {self.turn}")
+            sleep(delay)
+            delay = min(delay * 2, max_delay)
 
-    def step(self, action: List[Order]) -> StepResult:
-        sleep(10)
-        api.send_orders(self.gameid, self.mapstruct, orders=action, turn=self.turn + 1, playerid=self.p1, botgame=False)
-        self.mapstate = self.get_mapstate_blocking()
+    def ready(self, info) -> bool:
+        """Whether game_info says it's our move, i.e. a turn we haven't sent orders for has started"""
+        player = info["players"].get(self.p1, info["players"].get(str(self.p1)))
+        return (
+            info["state"] == "Playing"
+            and info["turn"] > self.turn
+            and player is not None
+            and not player["hasCommittedOrders"]
+        )
 
+    def observe(self, mapstate: Optional[MapState] = None) -> MapState:
+        """Record the state of the current turn, fetching it if it isn't given"""
+        if mapstate is None:
+            mapstate, _ = api.turn_state(self.gameid, mapstruct=self.mapstruct, playerid=self.p1, botgame=False, refresh=True)
+        self.mapstate = mapstate
+        if self.p2 is None:
+            self.p2 = first(p for p in self.mapstate.owner if p not in { self.p1, 0 })
+        return self.mapstate
+
+    def act(self, action: List[Order]):
+        """Send this turn's orders without waiting for the other player"""
+        api.send_orders(self.gameid, self.mapstruct, orders=action, turn=self.turn + 1, playerid=self.p1, botgame=False, state=self.mapstate)
         self.turn += 1
-        winner = self.winner()
 
-        return self.mapstate, 1 if winner == self.p1 else -1 if winner == self.p2 else 0, winner is not None, False, self.info()
+    def step(self, action: Action) -> StepResult:
+        with instrument.span("env.send_orders"):
+            self.act(self._orders(action))
+        with instrument.span("env.fetch_state"):
+            self.observe(self.get_mapstate_blocking())
+
+        with instrument.span("env.winner"):
+            winner = self.winner()
+
+        return self._observation(), 1 if winner == self.p1 else -1 if winner == self.p2 else 0, winner is not None, False, self.info()
 
     def winner(self) -> Optional[int]:
-        info = api.game_info(self.gameid, botgame=False)
+        info = api.game_info(self.gameid, botgame=False, cached=True)
         players = [
                 player
                 for player, player_info in info["players"].items()
@@ -121,4 +224,63 @@ class PlayerGame(Game):
         print(f"Turn {self.turn}:")
         print(f"  Territories: {(self.mapstate.owner == self.p1).sum()} : {(self.mapstate.owner == self.p2).sum()}")
         print(f"  Armies: {self.mapstate.armies[self.mapstate.owner == self.p1].sum()} : {self.mapstate.armies[self.mapstate.owner == self.p2].sum()}")
-        print(f"  Income: {self.mapstate.income(self.p1)} : {self.mapstate.income(self.p2)}")
+        incomes = self.mapstate.incomes([self.p1, self.p2])
+        print(f"  Income: {incomes[self.p1]} : {incomes[self.p2]}")
+
+class LocalGame(Game):
+    playerid = 1
+
+    def __init__(self, mapstruct: Optional[MapStructure] = None, opponent: Optional[Agent] = None, max_turns: int = 200):
+        self.mapstruct = mapstruct
+        self.opponent = opponent or Random(2)
+        self.max_turns = max_turns
+        self.mapstate = None
+        self.compact = False
+        # vector envs read the spaces before the first reset
+        if mapstruct is not None:
+            self._set_spaces()
+
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed, options=options)
+        options = options or {}
+        self.turn = 0
+        if "mapstruct" in options:
+            self.mapstruct = options["mapstruct"]
+        elif "mapid" in options or self.mapstruct is None:
+            self.mapstruct = load_mapstruct(options.get("mapid", api.MapID.SMALL_EARTH), cache=options.get("cache"))
+        self._set_spaces()
+        self.compact = options.get("compact", False)
+        if seed is not None:
+            # so the whole game, opponent included, replays from the seed
+            self.opponent.seed(int(self.np_random.integers(2 ** 63)))
+        self.mapstate = engine.initial_state(self.mapstruct, [1, self.opponent.playerid], rng=self.np_random)
+        return self._observation(), self.info()
+
+    def step(self, action: Action) -> StepResult:
+        with instrument.span("agent", agent=type(self.opponent).__name__, turn=self.turn):
+            opponent = self.opponent(self.mapstate)
+        with instrument.span("env.resolve_turn"):
+            self.mapstate = engine.resolve_turn(self.mapstate, [*self._orders(action), *opponent], rng=self.np_random, inplace=True)
+
+        self.turn += 1
+        with instrument.span("env.winner"):
+            winner = self.winner()
+
+        return self._observation(), 1 if winner == 1 else -1 if winner == self.opponent.playerid else 0, winner is not None, self.turn >= self.max_turns, self.info()
+
+    def winner(self) -> Optional[int]:
+        return self.mapstate.winner()
+
+    def state(self) -> MapState:
+        # the game runs on real ids so the opponent sees the ids it knows, only the
+        # observation is compact. Player 1 is index 1 as well, so its orders need no translating.
+        # Turns resolve in place, so callers keeping states get copies either way
+        return self.mapstate.compact([1, self.opponent.playerid]) if self.compact else self.mapstate.copy()
+
+    def display(self):
+        p1, p2 = 1, self.opponent.playerid
+        print(f"Turn {self.turn}:")
+        print(f"  Territories: {(self.mapstate.owner == p1).sum()} : {(self.mapstate.owner == p2).sum()}")
+        print(f"  Armies: {self.mapstate.armies[self.mapstate.owner == p1].sum()} : {self.mapstate.armies[self.mapstate.owner == p2].sum()}")
+        incomes = self.mapstate.incomes([p1, p2])
+        print(f"  Income: {incomes[p1]} : {incomes[p2]}")
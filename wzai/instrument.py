@@ -0,0 +1,137 @@
+"""Timing of api calls, agent decisions and env phases, sent to pluggable sinks
+
+Nothing is measured until a sink is added, and until then span() hands
+back a shared do-nothing object, so instrumented code pays one function
+call per span.
+
+    hist = instrument.Histograms()
+    instrument.add_sink(hist)
+    env.play(bot, display=False)
+    print(hist.summary())
+
+Every span ends as an event (name, seconds, fields). The names in use are
+api.call (fields endpoint, request_bytes, response_bytes, retries), agent,
+and env.step, env.send_orders, env.fetch_state, env.winner and
+env.resolve_turn for the phases of a turn.
+"""
+from collections import defaultdict
+from time import perf_counter
+from typing import Any, Callable, Dict, IO, List, Optional, Union
+import json
+import math
+
+Event = Callable[[str, float, Dict[str, Any]], None]
+
+_sinks: List[Event] = []
+
+def add_sink(sink: Event) -> Event:
+    """Start sending events to sink, any callable taking (name, seconds, fields)"""
+    _sinks.append(sink)
+    return sink
+
+def remove_sink(sink: Event):
+    _sinks.remove(sink)
+
+def enabled() -> bool:
+    return bool(_sinks)
+
+def span(name: str, **fields) -> "Span":
+    """Time a with block, for example `with span("agent") as s: ...; s.set(orders=len(orders))`"""
+    return Span(name, fields) if _sinks else _NULL_SPAN
+
+def emit(name: str, seconds: float, **fields):
+    for sink in _sinks:
+        sink(name, seconds, fields)
+
+class Span:
+    def __init__(self, name: str, fields: Dict[str, Any]):
+        self.name = name
+        self.fields = fields
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self) -> "Span":
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        emit(self.name, perf_counter() - self.start, **self.fields)
+
+class _NullSpan(Span):
+    def __init__(self): pass
+    def set(self, **fields): pass
+    def __enter__(self): return self
+    def __exit__(self, *exc): pass
+
+_NULL_SPAN = _NullSpan()
+
+class Histograms:
+    """Keeps count, total, min, max and log2-spaced buckets of the durations of every event name
+
+    Events with an endpoint field, like api.call, are also kept per endpoint
+    under "api.call:GetGameInfo".
+    """
+    def __init__(self):
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.totals: Dict[str, float] = defaultdict(float)
+        self.mins: Dict[str, float] = defaultdict(lambda: math.inf)
+        self.maxs: Dict[str, float] = defaultdict(float)
+        # bucket b counts durations in [2**(b-1), 2**b) microseconds
+        self.buckets: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    def __call__(self, name: str, seconds: float, fields: Dict[str, Any]):
+        self._add(name, seconds)
+        if "endpoint" in fields:
+            self._add(f"{name}:{fields['endpoint']}", seconds)
+
+    def _add(self, name: str, seconds: float):
+        self.counts[name] += 1
+        self.totals[name] += seconds
+        self.mins[name] = min(self.mins[name], seconds)
+        self.maxs[name] = max(self.maxs[name], seconds)
+        self.buckets[name][max(0, math.ceil(math.log2(max(seconds * 1e6, 1))))] += 1
+
+    def percentile(self, name: str, q: float) -> float:
+        """Upper edge of the bucket holding the q-th percentile, in seconds"""
+        target, seen = q / 100 * self.counts[name], 0
+        for bucket in sorted(self.buckets[name]):
+            seen += self.buckets[name][bucket]
+            if seen >= target:
+                return min(2 ** bucket / 1e6, self.maxs[name])
+        return self.maxs[name]
+
+    def summary(self) -> str:
+        lines = [f"{'event':<32} {'count':>7} {'total s':>9} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}"]
+        for name in sorted(self.counts):
+            count = self.counts[name]
+            lines.append(
+                f"{name:<32} {count:>7} {self.totals[name]:>9.3f} {self.totals[name] / count * 1e3:>9.2f} "
+                f"{self.percentile(name, 50) * 1e3:>9.2f} {self.percentile(name, 99) * 1e3:>9.2f} {self.maxs[name] * 1e3:>9.2f}"
+            )
+        return "\n".join(lines)
+
+class JsonLines:
+    """Appends every event to a file as one json object per line"""
+    def __init__(self, file: Union[str, IO]):
+        self.file = open(file, "a") if isinstance(file, str) else file
+        self._owned = isinstance(file, str)
+
+    def __call__(self, name: str, seconds: float, fields: Dict[str, Any]):
+        self.file.write(json.dumps({ "event": name, "seconds": seconds, **fields }, default=str) + "\n")
+
+    def close(self):
+        if self._owned:
+            self.file.close()
+        else:
+            self.file.flush()
+
+class Callback:
+    """Passes events on to fn, only those whose name starts with prefix if one is given"""
+    def __init__(self, fn: Event, prefix: Optional[str] = None):
+        self.fn = fn
+        self.prefix = prefix
+
+    def __call__(self, name: str, seconds: float, fields: Dict[str, Any]):
+        if self.prefix is None or name.startswith(self.prefix):
+            self.fn(name, seconds, fields)
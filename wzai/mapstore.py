@@ -0,0 +1,154 @@
+"""Versioned on-disk map format that loads without networkx or pickle
+
+Every map is a directory of .npy arrays plus a small meta.json:
+
+    {root}/{mapid}/meta.json       format version, map name, territory and bonus names/values
+    {root}/{mapid}/indptr.npy      CSR adjacency
+    {root}/{mapid}/indices.npy
+    {root}/{mapid}/adjacency.npy   dense adjacency, for maps that have one
+    {root}/{mapid}/terr_ids.npy    the server's territory ids
+    {root}/{mapid}/bonus_indptr.npy, bonus_indices.npy
+                                   territory-by-bonus incidence in CSR form
+    {root}/{mapid}/distances.npy, bonus_boundary.npy, bonus_frontier.npy, bonus_adjacency.npy
+                                   the MapStructure tables of the same names, optional
+
+The arrays are memory-mapped on load, so worker processes reading the same
+store share one copy through the page cache. Fill a store ahead of time with
+
+    python -m wzai.mapstore maps/
+"""
+from .types import Bonus, MapStructure
+
+from typing import Iterable, Optional
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+FORMAT_VERSION = 1
+
+# Precomputed on save, and computed on first use instead for maps stored without them
+TABLES = ("distances", "bonus_boundary", "bonus_frontier", "bonus_adjacency")
+
+def path(root: str, mapid: int) -> str:
+    return os.path.join(root, str(int(mapid)))
+
+def exists(root: str, mapid: int) -> bool:
+    """Whether the store has the map in the current format"""
+    try:
+        with open(os.path.join(path(root, mapid), "meta.json")) as file:
+            return json.load(file)["version"] == FORMAT_VERSION
+    except (OSError, ValueError, KeyError):
+        return False
+
+def save(mapstruct: MapStructure, root: str) -> str:
+    """Write a map to the store, replacing it atomically so concurrent readers never see half a map"""
+    os.makedirs(root, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=root, prefix=f".{mapstruct.mapid}-")
+    meta = {
+        "version": FORMAT_VERSION,
+        "mapid": int(mapstruct.mapid),
+        "name": mapstruct.name,
+        "territories": list(mapstruct.names),
+        "bonuses": [{ "name": bonus.name, "value": int(bonus.value) } for bonus in mapstruct.bonuses],
+    }
+    arrays = {
+        "indptr": mapstruct.indptr,
+        "indices": mapstruct.indices,
+        "terr_ids": mapstruct.terr_ids,
+        "bonus_indptr": mapstruct.bonus_indptr,
+        "bonus_indices": mapstruct.bonus_indices,
+    }
+    for table in TABLES:
+        arrays[table] = getattr(mapstruct, table)
+    if mapstruct.adjacency is not None:
+        arrays["adjacency"] = mapstruct.adjacency
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(array))
+    # meta.json last, since exists() keys off it
+    with open(os.path.join(tmp, "meta.json"), "w") as file:
+        json.dump(meta, file)
+
+    # an old copy is moved aside rather than deleted in place, so the
+    # directory is only ever missing for the moment between the renames
+    target = path(root, mapstruct.mapid)
+    old = tmp + "-old"
+    try:
+        os.rename(target, old)
+    except OSError:
+        # nothing stored yet, or another process moved it first
+        pass
+    try:
+        os.rename(tmp, target)
+    except OSError:
+        # another process stored the same map first
+        shutil.rmtree(tmp, ignore_errors=True)
+    shutil.rmtree(old, ignore_errors=True)
+    return target
+
+def load(root: str, mapid: int, mmap: bool = True) -> MapStructure:
+    directory = path(root, mapid)
+    with open(os.path.join(directory, "meta.json")) as file:
+        meta = json.load(file)
+    if meta["version"] != FORMAT_VERSION:
+        raise ValueError(f"Map {mapid} is stored in format {meta['version']}, expected {FORMAT_VERSION}")
+
+    def array(name: str) -> Optional[np.ndarray]:
+        filename = os.path.join(directory, f"{name}.npy")
+        if not os.path.isfile(filename):
+            return None
+        return np.load(filename, mmap_mode="r" if mmap else None)
+
+    bonus_indptr, bonus_indices = array("bonus_indptr"), array("bonus_indices")
+    bonuses = [
+        Bonus(bonus["name"], set(bonus_indices[bonus_indptr[i]:bonus_indptr[i + 1]].tolist()), bonus["value"])
+        for i, bonus in enumerate(meta["bonuses"])
+    ]
+    mapstruct = MapStructure.from_arrays(
+        meta["mapid"],
+        meta["name"],
+        meta["territories"],
+        array("terr_ids"),
+        array("indptr"),
+        array("indices"),
+        bonuses,
+        adjacency=array("adjacency"),
+    )
+    for table in TABLES:
+        setattr(mapstruct, f"_{table}", array(table))
+    return mapstruct
+
+def download(mapid: int) -> MapStructure:
+    from . import api
+    # The only way to download map data seems to be by creating a game
+    gameid = api.create_game([1, 2], botgame=True, mapid=mapid)
+    return api.map_structure(gameid, botgame=True)
+
+def prefetch(root: str, mapids: Optional[Iterable[int]] = None, force: bool = False, verbose: bool = False):
+    """Download every map (all of api.MapID by default) that isn't already stored"""
+    if mapids is None:
+        from . import api
+        mapids = list(api.MapID)
+    for mapid in mapids:
+        if force or not exists(root, mapid):
+            save(download(mapid), root)
+            if verbose:
+                print(f"Stored {getattr(mapid, 'name', mapid)} ({int(mapid)})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Download maps into a wzai map store")
+    parser.add_argument("root", help="directory of the store")
+    parser.add_argument("mapids", nargs="*", help="map ids or api.MapID names, all of them by default")
+    parser.add_argument("--force", action="store_true", help="download maps that are already stored")
+    args = parser.parse_args()
+
+    mapids = None
+    if args.mapids:
+        from . import api
+        mapids = [int(mapid) if mapid.isdigit() else api.MapID[mapid] for mapid in args.mapids]
+    prefetch(args.root, mapids, force=args.force, verbose=True)
+
+if __name__ == "__main__":
+    main()
@@ -4,11 +4,12 @@ from .types import MapState, MapStructure
 from .utils import pretty_print
 
 from functools import lru_cache
-from typing import Tuple, Dict
+from typing import Tuple, Dict, List, Optional, Sequence
+import math
 import numpy as np
 
 def fixed_round(x: float) -> int:
-    return int(np.floor(x + 0.5))
+    return math.floor(x + 0.5)
 
 @pretty_print("player")
 class Order:
@@ -20,13 +21,31 @@ class Order:
         if not inplace:
             state = state.copy()
         state.assert_valid()
-        return self._execute(state)
+        return self.apply(state)
+
+    def apply(self, state: MapState):
+        """Execute in place without validation, keeping a tracked state's hash current"""
+        if state._tracker is None:
+            return self._execute(state)
+        touched = self.touched()
+        state._rehash(touched)
+        self._execute(state)
+        state._rehash(touched)
+        return state
     
+    def assert_valid(self, state: MapState):
+        """Raise InvalidOrders unless the server would accept this order on its own"""
+        validate_orders(state, [self])
+
     def priority(self) -> int: raise NotImplementedError()
-    def assert_valid(self, state: MapState): raise NotImplementedError()
+    def touched(self) -> Tuple[int, ...]: raise NotImplementedError()
 
     def _execute(self, state: MapState): raise NotImplementedError()
-    def _encode(self, mapstruct: MapStructure) -> Dict[str, object]: raise NotImplementedError()
+    def _encode(self, mapstruct: MapStructure, playerids: Optional[np.ndarray] = None) -> Dict[str, object]: raise NotImplementedError()
+
+    def _playerid(self, playerids: Optional[np.ndarray]) -> int:
+        # orders for compact states carry player indices
+        return self.player if playerids is None else int(playerids[self.player])
 
 @pretty_print("player", "src", "dst", "armies")
 class AttackTransferOrder(Order):
@@ -41,6 +60,7 @@ class AttackTransferOrder(Order):
         return fixed_round(attack - defend * 0.7), fixed_round(defend - attack * 0.6)
 
     def priority(self): return 50
+    def touched(self): return (self.src, self.dst)
 
     def _execute(self, state: MapState):
         if state.owner[self.src] != self.player:
@@ -60,7 +80,7 @@ class AttackTransferOrder(Order):
                 # attacker wins
                 state.armies[self.src] -= attack
                 state.armies[self.dst] = attack_survive
-                state.owner[self.dst] = self.player
+                state.set_owner(self.dst, self.player)
             else:
                 # defender wins
                 attack_survive = max(attack_survive, 0)
@@ -68,23 +88,16 @@ class AttackTransferOrder(Order):
                 state.armies[self.dst] = max(defend_survive, 0)
         return state
 
-    def _encode(self, mapstruct: MapStructure) -> Dict[str, object]:
+    def _encode(self, mapstruct: MapStructure, playerids: Optional[np.ndarray] = None) -> Dict[str, object]:
         return {
             "type": "GameOrderAttackTransfer",
-            "playerID": self.player,
+            "playerID": self._playerid(playerids),
             "from": mapstruct._wz_terr_id(self.src),
             "to": mapstruct._wz_terr_id(self.dst),
             "numArmies": str(self.armies),
             "attackTeammates": True
         }
 
-    def assert_valid(self, state: MapState):
-        assert np.issubdtype(type(self.armies), int)
-        assert np.issubdtype(type(self.src), int)
-        assert np.issubdtype(type(self.dst), int)
-        assert self.dst in state.neighbors(self.src)
-        assert self.armies > 0
-
 
 @pretty_print("player", "target", "armies")
 class DeployOrder(Order):
@@ -94,21 +107,121 @@ class DeployOrder(Order):
         self.armies = int(armies)
 
     def priority(self): return 25
+    def touched(self): return (self.target,)
 
     def _execute(self, state):
         state.armies[self.target] += self.armies
         return state
 
-    def _encode(self, mapstruct: MapStructure) -> Dict[str, object]:
+    def _encode(self, mapstruct: MapStructure, playerids: Optional[np.ndarray] = None) -> Dict[str, object]:
         return {
             "type": "GameOrderDeploy",
-            "playerID": self.player,
+            "playerID": self._playerid(playerids),
             "armies": str(self.armies),
             "deployOn": mapstruct._wz_terr_id(self.target)
         }
 
-    def assert_valid(self, state: MapState):
-        assert np.issubdtype(type(self.armies), int)
-        assert np.issubdtype(type(self.target), int)
-        assert state.owner[self.target] == self.player
-        assert 0 < self.armies <= state.income(self.player)
+class InvalidOrders(ValueError):
+    def __init__(self, errors: List[str]):
+        super().__init__("\n".join(errors))
+        self.errors = errors
+
+def validate_orders(state: MapState, orders: Sequence[Order]):
+    """Check a whole turn at once and raise InvalidOrders listing every problem
+
+    Deploys must land on the player's own territories and add up to at most
+    their income, attacks must start from their territories and follow an
+    edge, and every order needs a positive whole number of armies.
+    """
+    errors: List[str] = []
+
+    def check(problems: List[Tuple[str, np.ndarray]], orders: List[Order]):
+        for problem, bad in problems:
+            errors.extend(f"{orders[i]}: {problem}" for i in np.nonzero(bad)[0])
+
+    deploys = [order for order in orders if isinstance(order, DeployOrder)]
+    if deploys:
+        player, target, armies = _deploy_arrays(deploys)
+        check(_deploy_problems(state, player, target, armies), deploys)
+        incomes = state.incomes(np.unique(player).tolist())
+        for p, income in incomes.items():
+            deployed = armies[player == p].clip(0).sum()
+            if deployed > income:
+                errors.append(f"player {p} deploys {deployed} armies with an income of {income}")
+
+    attacks = [order for order in orders if isinstance(order, AttackTransferOrder)]
+    if attacks:
+        check(_attack_problems(state, *_attack_arrays(attacks)), attacks)
+
+    errors.extend(
+        f"{order}: armies must be a whole number"
+        for order in deploys + attacks
+        if not isinstance(order.armies, (int, np.integer))
+    )
+    errors.extend(
+        f"{order}: territories must be whole numbers"
+        for order in attacks
+        if not isinstance(order.src, (int, np.integer)) or not isinstance(order.dst, (int, np.integer))
+    )
+
+    if errors:
+        raise InvalidOrders(errors)
+
+# The checks are split out as (problem, mask over the orders) pairs so the
+# engine can drop the orders validate_orders would complain about
+
+def _deploy_arrays(orders: Sequence[DeployOrder]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    return (
+        np.array([order.player for order in orders], dtype=np.int64),
+        np.array([order.target for order in orders], dtype=np.int64),
+        np.array([order.armies for order in orders]),
+    )
+
+def _attack_arrays(orders: Sequence[AttackTransferOrder]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """(player, src, dst, armies) of attack/transfer orders"""
+    return (
+        np.array([order.player for order in orders], dtype=np.int64),
+        np.array([order.src for order in orders], dtype=np.int64),
+        np.array([order.dst for order in orders], dtype=np.int64),
+        np.array([order.armies for order in orders]),
+    )
+
+def _deploy_problems(state: MapState, player: np.ndarray, target: np.ndarray, armies: np.ndarray) -> List[Tuple[str, np.ndarray]]:
+    """What is wrong with each deploy on its own, incomes aside"""
+    inside = (0 <= target) & (target < len(state.mapstruct))
+    return [
+        ("no such territory", ~inside),
+        ("not owned by the player", inside & (state.owner[np.where(inside, target, 0)] != player)),
+        ("armies must be positive", armies <= 0),
+    ]
+
+def _attack_problems(state: MapState, player: np.ndarray, src: np.ndarray, dst: np.ndarray, armies: np.ndarray, owned: bool = True) -> List[Tuple[str, np.ndarray]]:
+    """What is wrong with each attack/transfer order, the source's owner only checked if owned"""
+    n = len(state.mapstruct)
+    inside = (0 <= src) & (src < n) & (0 <= dst) & (dst < n)
+    src, dst = src[inside], dst[inside]
+    adjacent = np.zeros(len(inside), dtype=bool)
+    adjacent[inside] = state.mapstruct.is_adjacent(src, dst)
+    problems = [("no such territory", ~inside)]
+    if owned:
+        source_owned = np.zeros(len(inside), dtype=bool)
+        source_owned[inside] = state.owner[src] == player[inside]
+        problems.append(("source not owned by the player", inside & ~source_owned))
+    problems += [
+        ("territories are not adjacent", inside & ~adjacent),
+        ("armies must be positive", armies <= 0),
+    ]
+    return problems
+
+def _decode_order(data: Dict[str, object], mapstruct: MapStructure) -> Optional[Order]:
+    """The inverse of Order._encode, None for order types we don't model"""
+    if data["type"] == "GameOrderDeploy":
+        return DeployOrder(int(data["playerID"]), mapstruct._terr_index(data["deployOn"]), int(data["armies"]))
+    if data["type"] == "GameOrderAttackTransfer":
+        return AttackTransferOrder(
+            int(data["playerID"]),
+            mapstruct._terr_index(data["from"]),
+            mapstruct._terr_index(data["to"]),
+            int(data["numArmies"])
+        )
+    return None
@@ -0,0 +1,81 @@
+"""Streaming reader for ExportBotGame replays
+
+A replay is read as a sequence of standings and turns, where a turn's
+orders are given by the same fields the API uses to send them:
+
+    <Game>
+      <Standing>
+        <Territory terrID="..." ownedBy="Neutral" armies="2"/>
+        ...
+      </Standing>
+      <Turn number="1">
+        <Orders>
+          <GameOrderDeploy playerID="..." deployOn="..." armies="5"/>
+          <GameOrderAttackTransfer playerID="..." from="..." to="..." numArmies="5"/>
+        </Orders>
+        <Standing>...</Standing>
+      </Turn>
+      ...
+    </Game>
+
+Fields may be attributes or child elements, and tag names are matched
+without namespaces. Elements are dropped as soon as they are read, so a
+replay is never held in memory as a whole.
+"""
+from .orders import Order, _decode_order
+from .types import MapState, MapStructure
+
+from typing import IO, Dict, Iterator, List, Optional, Tuple, Union
+import io
+import xml.etree.ElementTree as ET
+
+Turn = Tuple[MapState, List[Order]]
+
+def iter_replay(source: Union[str, IO], mapstruct: MapStructure) -> Iterator[Turn]:
+    """Yield (state at the start of the turn, orders of the turn) for every turn of the replay
+
+    source is a path or an open file, use io.StringIO for the string
+    api.get_replay returns.
+    """
+    from .api import _to_map_state
+    state: Optional[MapState] = None
+    orders: Optional[List[Order]] = None
+    # open elements, so finished ones can be dropped from their parent rather than left as empty shells
+    open_elems: List[ET.Element] = []
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        tag = _local(elem.tag)
+        if event == "start":
+            open_elems.append(elem)
+            if tag == "Turn":
+                orders = []
+            continue
+        open_elems.pop()
+        if tag == "Standing":
+            standing = _to_map_state([_territory(terr) for terr in elem if _local(terr.tag) == "Territory"], mapstruct)
+            if orders is not None and state is not None:
+                yield state, orders
+                orders = None
+            state = standing
+        elif tag.startswith("GameOrder") and orders is not None:
+            order = _decode_order({ "type": tag, **_fields(elem) }, mapstruct)
+            if order is not None:
+                orders.append(order)
+        elif tag != "Turn":
+            continue
+        if open_elems:
+            open_elems[-1].remove(elem)
+
+def read_replay(xml: str, mapstruct: MapStructure) -> List[Turn]:
+    return list(iter_replay(io.StringIO(xml), mapstruct))
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+def _territory(elem: ET.Element) -> Dict[str, object]:
+    fields = _fields(elem)
+    return { **fields, "terrID": int(fields["terrID"]) }
+
+def _fields(elem: ET.Element) -> Dict[str, str]:
+    fields = { _local(child.tag): (child.text or "").strip() for child in elem }
+    fields.update(elem.attrib)
+    return fields
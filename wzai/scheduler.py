@@ -0,0 +1,124 @@
+from . import api
+from .agent import Agent
+from .gym import PlayerGame
+
+from time import monotonic, sleep
+from typing import Callable, Dict, List, Optional
+import heapq
+import itertools
+
+ReadyHook = Callable[[PlayerGame, dict], None]
+FinishedHook = Callable[[PlayerGame, Optional[int]], None]
+
+class Scheduler:
+    """Plays many PlayerGames from one process, moving in each only once its turn is ready
+
+    Every game is polled with game_info on its own timer. A poll that finds
+    nothing to do backs that game's delay off (up to max_delay). A poll that
+    finds the turn ready runs the agent, sends its orders and resets the
+    delay to min_delay, since the other player may answer quickly. A poll
+    that raises (a connection error, or the agent failing) is logged and
+    backed off like an idle one, without holding up the other games. Games
+    can be added while the scheduler is running.
+
+        scheduler = Scheduler(on_finished=lambda game, winner: print(game.gameid, winner))
+        for email in players:
+            game = PlayerGame()
+            game.reset(options={"player": email, "wait": False})
+            scheduler.add(game, Random(api.BOT_ID))
+        scheduler.run()
+    """
+    def __init__(
+            self,
+            min_delay: float = 2.0,
+            max_delay: float = 60.0,
+            backoff: float = 1.5,
+            on_ready: Optional[ReadyHook] = None,
+            on_finished: Optional[FinishedHook] = None):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.on_ready: List[ReadyHook] = [on_ready] if on_ready else []
+        self.on_finished: List[FinishedHook] = [on_finished] if on_finished else []
+        self._queue: List[tuple] = []
+        self._agents: Dict[int, Agent] = {}
+        self._delays: Dict[int, float] = {}
+        self._games: Dict[int, PlayerGame] = {}
+        # the counter of each game's live queue entry, older entries are skipped when they come up
+        self._entries: Dict[int, int] = {}
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._games)
+
+    def add(self, game: PlayerGame, agent: Agent, delay: float = 0.0):
+        self._games[game.gameid] = game
+        self._agents[game.gameid] = agent
+        self._delays[game.gameid] = self.min_delay
+        self._push(game.gameid, monotonic() + delay)
+
+    def remove(self, game: PlayerGame):
+        # its queue entry is skipped once it comes up
+        self._games.pop(game.gameid, None)
+        self._agents.pop(game.gameid, None)
+        self._delays.pop(game.gameid, None)
+        self._entries.pop(game.gameid, None)
+
+    def run(self, timeout: Optional[float] = None):
+        """Poll games until all of them have finished, or until the timeout"""
+        deadline = None if timeout is None else monotonic() + timeout
+        while self._games and (deadline is None or monotonic() < deadline):
+            due = self._queue[0][0]
+            wait = due - monotonic() if deadline is None else min(due, deadline) - monotonic()
+            if wait > 0:
+                sleep(wait)
+            self.run_once()
+
+    def run_once(self) -> int:
+        """Poll every game that is due and return how many of them moved"""
+        moved = 0
+        now = monotonic()
+        while self._queue and self._queue[0][0] <= now:
+            _, entry, gameid = heapq.heappop(self._queue)
+            if self._entries.get(gameid) != entry:
+                continue
+            try:
+                if self._poll(self._games[gameid]):
+                    moved += 1
+            except Exception as e:
+                # one game's server error or agent crash shouldn't stop the others
+                if gameid in self._games:
+                    self._delays[gameid] = min(self._delays[gameid] * self.backoff, self.max_delay)
+                    print(f"Polling game {gameid} failed, retrying in {self._delays[gameid]:.0f}s: {e!r}")
+            if self._entries.get(gameid) == entry:
+                self._push(gameid, monotonic() + self._delays[gameid])
+        return moved
+
+    def _push(self, gameid: int, due: float):
+        entry = self._entries[gameid] = next(self._counter)
+        heapq.heappush(self._queue, (due, entry, gameid))
+
+    def _poll(self, game: PlayerGame) -> bool:
+        info = api.game_info(game.gameid, botgame=False)
+        if info["state"] == "Finished":
+            self.remove(game)
+            winner = game.winner()
+            for hook in self.on_finished:
+                hook(game, winner)
+            return False
+
+        if not game.ready(info):
+            self._delays[game.gameid] = min(self._delays[game.gameid] * self.backoff, self.max_delay)
+            return False
+
+        for hook in self.on_ready:
+            hook(game, info)
+        try:
+            state = game.observe()
+        except api.ServerException:
+            # the info was ahead of the standing, try again shortly
+            self._delays[game.gameid] = self.min_delay
+            return False
+        game.act(self._agents[game.gameid](state))
+        self._delays[game.gameid] = self.min_delay
+        return True
@@ -0,0 +1,91 @@
+from .orders import Order
+from .types import MapState
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Iterable, List, Optional, Tuple, Union
+
+class Journal:
+    """Apply orders to a state in place while logging what they overwrite
+
+    Rolling back restores only the territories the orders touched, so a tree
+    search can walk down and back up a single state instead of copying it at
+    every node:
+
+        journal = Journal(state)
+        mark = journal.apply(orders)
+        ...
+        journal.undo(mark)
+    """
+    def __init__(self, state: MapState):
+        self.state = state
+        self._log: List[Tuple[int, int, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._log)
+
+    def apply(self, orders: Iterable[Order]) -> int:
+        """Execute the orders without validation and return a mark to undo back to"""
+        mark = len(self._log)
+        for order in orders:
+            for terr in order.touched():
+                self._log.append((terr, self.state.armies[terr], self.state.owner[terr]))
+            order.apply(self.state)
+        return mark
+
+    def undo(self, mark: int = 0):
+        while len(self._log) > mark:
+            terr, armies, owner = self._log.pop()
+            self.state._rehash((terr,))
+            self.state.armies[terr] = armies
+            self.state.set_owner(terr, owner)
+            self.state._rehash((terr,))
+
+    @contextmanager
+    def applied(self, orders: Iterable[Order]):
+        mark = self.apply(orders)
+        try:
+            yield self.state
+        finally:
+            self.undo(mark)
+
+class TranspositionTable:
+    """Bounded map from position hashes to search results, evicting the least recently used
+
+    Keys are MapState.zobrist() hashes (a state is hashed on the way in), and
+    values are whatever the search wants to keep, e.g. a (value, priors) pair.
+    """
+    def __init__(self, capacity: int = 1 << 20):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[int, Any] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Union[int, MapState]) -> bool:
+        return _key(key) in self._entries
+
+    def get(self, key: Union[int, MapState], default: Optional[Any] = None) -> Any:
+        key = _key(key)
+        if key not in self._entries:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key: Union[int, MapState], value: Any):
+        key = _key(key)
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+def _key(key: Union[int, MapState]) -> int:
+    return key.zobrist() if isinstance(key, MapState) else key
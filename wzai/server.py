@@ -0,0 +1,317 @@
+"""A stand-in for the Warzone AI server, running games on the local engine
+
+Serves the bot game endpoints (CreateBotGame, GetBotGameSettings,
+GetBotGameInfo, SendOrdersBotGame, ExportBotGame) plus the regular game
+endpoints under their own names, closely enough for wzai.api, the asyncio
+client, BotGame and PlayerGame to run against it offline:
+
+    with Server(maps={ mapstruct.mapid: mapstruct }, latency=0.05) as server:
+        api.configure(root=server.root)
+        wzai.gym.BotGame().play(bot)
+
+or from a shell, with WZAI_API_ROOT=http://127.0.0.1:8000/api/ set for the client
+
+    python -m wzai.server --port 8000 --cache maps
+
+Player tokens made by api._handle_token for an id (and "me", which stands
+for api.BOT_ID) are seats for the client, any other token is a seat the
+server plays with its opponent agent.
+"""
+from . import api
+from . import engine
+from . import mapstore
+from .agent import Agent
+from .agents import Random
+from .orders import Order, _decode_order
+from .types import MapState, MapStructure
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+from typing import Callable, Dict, List, Optional
+import argparse
+import itertools
+import json
+import threading
+import xml.etree.ElementTree as ET
+import numpy as np
+
+class _Game:
+    def __init__(self, gameid: int, mapstruct: MapStructure, players: List[int], agents: Dict[int, Agent], settings: dict, rng: np.random.Generator):
+        self.gameid = gameid
+        self.mapstruct = mapstruct
+        self.players = players
+        self.agents = agents
+        self.rng = rng
+        self.state = engine.initial_state(
+            mapstruct,
+            players,
+            territories_per_player=settings.get("TerritoryLimit", 2),
+            armies_per_territory=settings.get("InitialPlayerArmiesPerTerritory", 2),
+            rng=rng,
+        )
+        self.turns = 0
+        self.orders: Dict[int, List[Order]] = {}
+        # (orders, standing after them) of every turn, for ExportBotGame
+        self.history: List[tuple] = []
+        self.initial = self.state.copy()
+        self.lock = threading.Lock()
+
+    def finished(self) -> bool:
+        return self.state.winner() is not None
+
+    def send_orders(self, player: int, turn: int, orders: List[Order]):
+        if self.finished():
+            raise api.ServerException("Game is over")
+        if player not in self.players or player in self.agents:
+            raise api.ServerException(f"Player {player} doesn't have a seat in game {self.gameid}")
+        if turn != self.turns + 1:
+            raise api.ServerException(f"Orders are for turn {turn}, the game is on turn {self.turns + 1}")
+        self.orders[player] = orders
+        if all(p in self.orders or p in self.agents or p not in self.state.players() for p in self.players):
+            self._advance()
+
+    def _advance(self):
+        for player, agent in self.agents.items():
+            if player in self.state.players():
+                self.orders[player] = agent(self.state)
+        orders = [order for player in self.players for order in self.orders.get(player, [])]
+        self.state = engine.resolve_turn(self.state, orders, rng=self.rng)
+        self.history.append((orders, self.state.copy()))
+        self.turns += 1
+        self.orders = {}
+
+    def info(self) -> dict:
+        alive = self.state.players()
+        return {
+            "game": {
+                "id": self.gameid,
+                "numberOfTurns": str(self.turns),
+                "state": "Finished" if self.finished() else "Playing",
+                "players": [
+                    {
+                        "id": player,
+                        # api clients take the players still "Playing" after the end as the winners
+                        "state": "Playing" if player in alive else "Eliminated",
+                        "hasCommittedOrders": str(player in self.orders),
+                    }
+                    for player in self.players
+                ],
+            },
+            "gameInfo": { "latestStanding": _standing(self.state) },
+        }
+
+    def replay(self) -> str:
+        root = ET.Element("Game", id=str(self.gameid))
+        root.append(_standing_xml(self.initial))
+        for number, (orders, state) in enumerate(self.history, start=1):
+            turn = ET.SubElement(root, "Turn", number=str(number))
+            orders_xml = ET.SubElement(turn, "Orders")
+            for order in orders:
+                data = { key: str(value) for key, value in order._encode(self.mapstruct).items() }
+                ET.SubElement(orders_xml, data.pop("type"), data)
+            turn.append(_standing_xml(state))
+        return ET.tostring(root, encoding="unicode")
+
+class Server:
+    """The stand-in server, serving from a background thread once started
+
+    Maps are taken from maps, or from the map store at cache the first time
+    a game asks for them. latency seconds are
+    slept before every response, to make the server feel remote.
+    """
+    def __init__(
+            self,
+            host: str = "127.0.0.1",
+            port: int = 0,
+            maps: Optional[Dict[int, MapStructure]] = None,
+            cache: Optional[str] = None,
+            latency: float = 0.0,
+            opponent: Callable[[int, int], Agent] = Random,
+            seed: int = 0):
+        self.maps = dict(maps or {})
+        self.cache = cache
+        self.latency = latency
+        self.opponent = opponent
+        self.seed = seed
+        self.games: Dict[int, _Game] = {}
+        self._gameids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _handler(self))
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def root(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/api/"
+
+    def start(self) -> "Server":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "Server":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handle(self, endpoint: str, data: dict) -> dict:
+        """The response to one request, as the handler sends it"""
+        handler = _ENDPOINTS.get(endpoint)
+        if handler is None:
+            return { "error": f"Unknown endpoint {endpoint}" }
+        try:
+            return handler(self, data)
+        except api.ServerException as e:
+            return { "error": str(e) }
+        except (KeyError, ValueError, TypeError) as e:
+            return { "error": f"Bad request: {e!r}" }
+
+    def _mapstruct(self, mapid: int) -> MapStructure:
+        with self._lock:
+            if mapid not in self.maps:
+                # never download, the client may well be pointed at this server
+                if self.cache is None or not mapstore.exists(self.cache, mapid):
+                    raise api.ServerException(f"Map {mapid} isn't available")
+                self.maps[mapid] = mapstore.load(self.cache, mapid)
+            return self.maps[mapid]
+
+    def _game(self, data: dict) -> _Game:
+        game = self.games.get(int(data["gameID"]))
+        if game is None:
+            raise api.ServerException(f"No game {data['gameID']}")
+        return game
+
+    def _create_game(self, data: dict) -> dict:
+        players = [_seat(player["token"]) for player in data["players"]]
+        # seats the server plays take the lowest ids nobody else has
+        free = (player for player in itertools.count(1) if player not in players)
+        played = []
+        for i, player in enumerate(players):
+            if player is None:
+                players[i] = next(free)
+                played.append(players[i])
+        settings = data.get("settings", {})
+        mapstruct = self._mapstruct(int(settings.get("Map", api.MapID.SMALL_EARTH)))
+        with self._lock:
+            gameid = next(self._gameids)
+        rng = np.random.default_rng((self.seed, gameid))
+        agents = { player: self.opponent(player, int(rng.integers(2 ** 63))) for player in played }
+        self.games[gameid] = _Game(gameid, mapstruct, players, agents, settings, rng)
+        return { "gameID": gameid }
+
+    def _settings(self, data: dict) -> dict:
+        return { "map": _map_data(self._game(data).mapstruct) }
+
+    def _info(self, data: dict) -> dict:
+        game = self._game(data)
+        with game.lock:
+            return game.info()
+
+    def _send_orders(self, data: dict) -> dict:
+        game = self._game(data)
+        orders = [_decode_order(order, game.mapstruct) for order in data["orders"]]
+        player = int(data["playerID"])
+        with game.lock:
+            game.send_orders(player, int(data["turnNumber"]), [order for order in orders if order is not None and order.player == player])
+        return { "result": "OK" }
+
+    def _export(self, data: dict) -> dict:
+        game = self._game(data)
+        with game.lock:
+            return { "result": game.replay() }
+
+_ENDPOINTS: Dict[str, Callable[[Server, dict], dict]] = {
+    "CreateBotGame": Server._create_game,
+    "CreateGame": Server._create_game,
+    "GetBotGameSettings": Server._settings,
+    "GetGameSettings": Server._settings,
+    "GetBotGameInfo": Server._info,
+    "GetGameInfo": Server._info,
+    "SendOrdersBotGame": Server._send_orders,
+    "SendOrders": Server._send_orders,
+    "ExportBotGame": Server._export,
+}
+
+def _handler(server: Server):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # headers and body go out as separate writes, which Nagle's algorithm would hold up by the delayed ack
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if server.latency > 0:
+                sleep(server.latency)
+            body = json.dumps(server.handle(self.path.rstrip("/").rsplit("/", 1)[-1], data)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+    return Handler
+
+def _seat(token: str) -> Optional[int]:
+    """The player id of a client's seat, None for seats the server plays"""
+    if token == "me":
+        return api.BOT_ID
+    if token.startswith("00") and token.endswith("00") and token[2:-2].isdigit():
+        return int(token[2:-2])
+    return None
+
+def _map_data(mapstruct: MapStructure) -> dict:
+    """The GetBotGameSettings form of a map, the inverse of api._to_map_structure"""
+    terr_ids = mapstruct.terr_ids.tolist()
+    return {
+        "id": int(mapstruct.mapid),
+        "name": mapstruct.name,
+        "territories": [
+            { "id": terr_ids[terr], "name": mapstruct.names[terr], "connectedTo": [terr_ids[dst] for dst in mapstruct.neighbors(terr).tolist()] }
+            for terr in range(len(mapstruct))
+        ],
+        "bonuses": [
+            { "name": bonus.name, "territoryIDs": [terr_ids[terr] for terr in sorted(bonus.terr)], "value": str(bonus.value) }
+            for bonus in mapstruct.bonuses
+        ],
+    }
+
+def _standing(state: MapState) -> List[dict]:
+    terr_ids = state.mapstruct.terr_ids.tolist()
+    return [
+        { "terrID": terr_ids[terr], "ownedBy": "Neutral" if owner == 0 else str(owner), "armies": str(armies) }
+        for terr, (owner, armies) in enumerate(zip(state.owner.tolist(), state.armies.tolist()))
+    ]
+
+def _standing_xml(state: MapState) -> ET.Element:
+    standing = ET.Element("Standing")
+    for terr in _standing(state):
+        ET.SubElement(standing, "Territory", { key: str(value) for key, value in terr.items() })
+    return standing
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a stand-in Warzone AI server on the local engine")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--cache", help="map store to load maps from")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before every response")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    server = Server(args.host, args.port, cache=args.cache, latency=args.latency, seed=args.seed)
+    print(f"Serving on {server.root}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server._httpd.server_close()
+
+if __name__ == "__main__":
+    main()
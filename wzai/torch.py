@@ -1,19 +1,74 @@
-from .types import MapStructure, MapState
+from .types import MapStructure, MapState, BatchMapState
 
+from typing import Optional, Sequence, Union
+import weakref
+import numpy as np
 import torch
 import torch_geometric as pyg
 
+# edge_index with self-loops, one per map, built from mapstruct.edges
+_edge_index_cache: "weakref.WeakKeyDictionary[MapStructure, torch.Tensor]" = weakref.WeakKeyDictionary()
+
 def from_mapstruct(mapstruct: MapStructure) -> torch.Tensor:
-    return pyg.utils.add_self_loops(
-        pyg.utils.from_networkx(
-            mapstruct._graph
-        ).edge_index
-    )[0]
-
-def from_mapstate(mapstate: MapState) -> torch.Tensor:
-    return torch.stack([
-        torch.tensor(mapstate.armies, dtype=torch.float),
-        torch.tensor(mapstate.owner == 1, dtype=torch.float),
-        torch.tensor(mapstate.owner == 2, dtype=torch.float),
-        torch.tensor(mapstate.owner == 0, dtype=torch.float),
-    ], dim=1)
+    """The map's (2, E + T) edge_index with self-loops, shared between calls so don't write to it"""
+    edge_index = _edge_index_cache.get(mapstruct)
+    if edge_index is None:
+        loops = np.arange(len(mapstruct))
+        edge_index = torch.from_numpy(np.concatenate([
+            mapstruct.edges.T.astype(np.int64),
+            np.stack([loops, loops]),
+        ], axis=1))
+        _edge_index_cache[mapstruct] = edge_index
+    return edge_index
+
+def from_mapstate(mapstate: MapState, players: Optional[Sequence[int]] = None) -> torch.Tensor:
+    """(T, 2 + P) node features: armies, one column per player, then neutral
+
+    players are owner values, so player indices for compact states. The
+    width never depends on who is still on the board: by default it is
+    every index of a compact state's playerids, and states with real ids
+    have to be given their players. Owners missing from players raise a
+    ValueError rather than getting no column.
+    """
+    armies, owner = mapstate.armies[None], mapstate.owner[None]
+    return torch.from_numpy(_features(armies, owner, _players(owner, mapstate.playerids, players))[0])
+
+def from_mapstates(
+        states: Union[Sequence[MapState], BatchMapState],
+        players: Optional[Sequence[int]] = None) -> pyg.data.Batch:
+    """Every state as one graph of a disjoint-union Batch, built without going through Data objects
+
+    All states must be on the same map. Node features are laid out as in
+    from_mapstate, with the players shared by the whole batch.
+    """
+    batch = states if isinstance(states, BatchMapState) else BatchMapState.from_states(states)
+    n, t = batch.armies.shape
+    players = _players(batch.owner, batch.playerids, players)
+    x = _features(batch.armies, batch.owner, players).reshape(n * t, -1)
+    edge_index = from_mapstruct(batch.mapstruct).numpy()
+    edge_index = (edge_index[:, None, :] + (np.arange(n) * t)[None, :, None]).reshape(2, -1)
+    return pyg.data.Batch(
+        x=torch.from_numpy(x),
+        edge_index=torch.from_numpy(edge_index),
+        batch=torch.from_numpy(np.repeat(np.arange(n), t)),
+        ptr=torch.from_numpy(np.arange(n + 1) * t),
+    )
+
+def _players(owner: np.ndarray, playerids: Optional[np.ndarray], players: Optional[Sequence[int]]) -> np.ndarray:
+    if players is not None:
+        players = np.asarray(players)
+    elif playerids is not None:
+        players = np.arange(1, len(playerids))
+    else:
+        raise ValueError("States with real player ids need players, e.g. [api.BOT_ID, opponent]")
+    missing = np.setdiff1d(owner, np.append(players, 0))
+    if len(missing):
+        raise ValueError(f"Owners {missing.tolist()} aren't among the players {players.tolist()}")
+    return players
+
+def _features(armies: np.ndarray, owner: np.ndarray, players: np.ndarray) -> np.ndarray:
+    x = np.empty(armies.shape + (len(players) + 2,), dtype=np.float32)
+    x[..., 0] = armies
+    x[..., 1:-1] = owner[..., None] == players
+    x[..., -1] = owner == 0
+    return x
@@ -0,0 +1,177 @@
+from .agent import Agent
+from .gym import Game, LocalGame
+from .types import MapStructure
+from .utils import pretty_print, load_mapstruct
+
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import permutations
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Union
+import os
+import numpy as np
+
+# Builds an agent from its player id and a seed, which the Random class already is
+AgentFactory = Callable[[int, int], Agent]
+
+INITIAL_ELO = 1500.0
+ELO_K = 32.0
+
+@pretty_print("index", "players", "mapid", "seed")
+class Match:
+    def __init__(self, index: int, players: Sequence[str], mapid: int, seed: int):
+        self.index = index
+        self.players = tuple(players)
+        self.mapid = mapid
+        self.seed = seed
+
+@pretty_print("match", "winner", "turns")
+class MatchResult:
+    def __init__(self, match: Match, winner: Optional[str], turns: int, seconds: float):
+        self.match = match
+        self.winner = winner
+        self.turns = turns
+        self.seconds = seconds
+
+class Tournament:
+    """Round robin between agents, every pair playing both seats on every map
+
+    Matches are spread over a process pool and each one is seeded from the
+    tournament seed and its index, so a rerun replays the same games no
+    matter how many processes there are. Agent factories have to be
+    picklable (module-level classes and functions are).
+
+        tournament = Tournament({ "random": Random, "mine": MyAgent }, [api.MapID.ITALY], games=50, cache="maps")
+        print(tournament.run().summary())
+
+    Games run on game_cls, LocalGame by default, which is built as
+    game_cls(mapstruct, opponent=..., max_turns=...) and seats the first
+    player of a match as player 1.
+    """
+    def __init__(
+            self,
+            agents: Dict[str, AgentFactory],
+            maps: Sequence[Union[int, MapStructure]],
+            games: int = 10,
+            seed: int = 0,
+            max_turns: int = 200,
+            processes: Optional[int] = None,
+            cache: Optional[str] = None,
+            game_cls: Callable[..., Game] = LocalGame):
+        assert len(agents) >= 2
+        self.agents = agents
+        self.maps = {
+            mapstruct.mapid: mapstruct
+            for mapstruct in (m if isinstance(m, MapStructure) else load_mapstruct(m, cache=cache) for m in maps)
+        }
+        self.games = games
+        self.seed = seed
+        self.max_turns = max_turns
+        self.processes = processes
+        self.game_cls = game_cls
+
+    def matches(self) -> List[Match]:
+        pairs = [(pair, mapid, game) for mapid in self.maps for game in range(self.games) for pair in permutations(self.agents, 2)]
+        seeds = np.random.SeedSequence(self.seed).generate_state(len(pairs), dtype=np.uint64)
+        return [Match(i, pair, mapid, int(seed)) for i, ((pair, mapid, _), seed) in enumerate(zip(pairs, seeds))]
+
+    def run(self, verbose: bool = False) -> "Standings":
+        matches = self.matches()
+        start = perf_counter()
+        context = (self.agents, self.maps, self.max_turns, self.game_cls)
+        if self.processes == 1:
+            _init_worker(*context)
+            results = _collect(map(_play, matches), len(matches), verbose)
+        else:
+            chunksize = max(1, len(matches) // (8 * (self.processes or os.cpu_count() or 1)))
+            with ProcessPoolExecutor(self.processes, initializer=_init_worker, initargs=context) as pool:
+                results = _collect(pool.map(_play, matches, chunksize=chunksize), len(matches), verbose)
+        return Standings(list(self.agents), results, perf_counter() - start)
+
+class Standings:
+    def __init__(self, agents: List[str], results: List[MatchResult], seconds: float):
+        self.agents = agents
+        self.results = sorted(results, key=lambda result: result.match.index)
+        self.seconds = seconds
+
+    @property
+    def games_per_second(self) -> float:
+        return len(self.results) / self.seconds if self.seconds > 0 else float("inf")
+
+    def scores(self) -> Dict[str, Dict[str, float]]:
+        """Points of each agent against each other agent, 1 per win and 1/2 per draw"""
+        scores: Dict[str, Dict[str, float]] = { agent: defaultdict(float) for agent in self.agents }
+        for result in self.results:
+            a, b = result.match.players
+            score = _score(result, a)
+            scores[a][b] += score
+            scores[b][a] += 1 - score
+        return scores
+
+    def win_rates(self) -> Dict[str, float]:
+        """Share of games won by each agent, counting draws as half"""
+        scores = self.scores()
+        games = defaultdict(int)
+        for result in self.results:
+            for player in result.match.players:
+                games[player] += 1
+        return {
+            agent: sum(scores[agent].values()) / games[agent] if games[agent] else 0.0
+            for agent in self.agents
+        }
+
+    def elo(self, k: float = ELO_K) -> Dict[str, float]:
+        """Elo ratings from replaying the results in match order"""
+        ratings = { agent: INITIAL_ELO for agent in self.agents }
+        for result in self.results:
+            a, b = result.match.players
+            expected = 1 / (1 + 10 ** ((ratings[b] - ratings[a]) / 400))
+            delta = k * (_score(result, a) - expected)
+            ratings[a] += delta
+            ratings[b] -= delta
+        return ratings
+
+    def summary(self) -> str:
+        elo, win_rates = self.elo(), self.win_rates()
+        width = max(len(agent) for agent in self.agents)
+        lines = [f"{len(self.results)} games in {self.seconds:.1f}s ({self.games_per_second:.2f} games/s)"]
+        for agent in sorted(self.agents, key=elo.get, reverse=True):
+            lines.append(f"  {agent:<{width}}  elo {elo[agent]:7.1f}  win rate {win_rates[agent]:6.1%}")
+        return "\n".join(lines)
+
+def _collect(results: Iterable[MatchResult], total: int, verbose: bool) -> List[MatchResult]:
+    collected = []
+    for result in results:
+        collected.append(result)
+        if verbose:
+            print(f"{len(collected)}/{total} {' vs '.join(result.match.players)}: {result.winner or 'draw'} in {result.turns} turns")
+    return collected
+
+def _score(result: MatchResult, player: str) -> float:
+    if result.winner is None:
+        return 0.5
+    return 1.0 if result.winner == player else 0.0
+
+# per process, set once by the pool initializer instead of pickled with every match
+_context = None
+
+def _init_worker(agents, maps, max_turns, game_cls):
+    global _context
+    _context = (agents, maps, max_turns, game_cls)
+
+def _play(match: Match) -> MatchResult:
+    agents, maps, max_turns, game_cls = _context
+    start = perf_counter()
+    first, second = match.players
+    agent_seed, opponent_seed, game_seed = np.random.SeedSequence(match.seed).generate_state(3)
+    agent = agents[first](1, int(agent_seed))
+    opponent = agents[second](2, int(opponent_seed))
+
+    game = game_cls(maps[match.mapid], opponent=opponent, max_turns=max_turns)
+    game.reset(seed=int(game_seed))
+    done = False
+    while not done:
+        _, _, terminated, truncated, _ = game.step(agent(game.state()))
+        done = terminated or truncated
+    winner = { 1: first, 2: second }.get(game.winner())
+    return MatchResult(match, winner, game.turn, perf_counter() - start)
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-from .utils import pretty_print, first
+from .utils import pretty_print
 
+from collections import defaultdict
 from itertools import product
-from typing import List, Optional, Set, Iterable, Dict
+from typing import List, Optional, Set, Iterable, Dict, Sequence, Tuple
 import numpy as np
 
 @pretty_print("name", "value")
@@ -14,89 +15,561 @@ class Bonus:
         self.value: int = value
 
     def owned_by(self, state: MapState, player: int):
-        return all(
-            state.owner[i] == player
-            for i in self.terr
-        )
+        return bool((state.owner[sorted(self.terr)] == player).all())
+
+BASE_INCOME = 5
+
+# Armies above this hash the same, so big stacks that differ by a few share a key
+ZOBRIST_ARMY_CAP = 1023
+_MASK64 = (1 << 64) - 1
+
+# Maps up to this many territories also get a dense (T, T) adjacency matrix
+DENSE_ADJACENCY_LIMIT = 2048
+
+# Hop distance between territories that aren't connected
+UNREACHABLE = np.iinfo(np.int16).max
 
 @pretty_print("name", "mapid")
 class MapStructure:
     def __init__(self, mapid: int, name: str, graph, bonuses: List[Bonus]):
         self.mapid = mapid
         self.name = name
-        self._graph = graph
-        self.bonuses = [bonus for bonus in bonuses if bonus.value != 0]
+        self._nx = graph
+        self.bonuses = [bonus for bonus in bonuses if bonus.value != 0 and bonus.terr]
+        self.names: List[str] = [graph.nodes[i]["name"] for i in range(len(graph.nodes))]
+        self.terr_ids = np.array([graph.nodes[i]["old_id"] for i in range(len(graph.nodes))], dtype=np.int64)
+        self._build_adjacency(*_graph_to_csr(graph))
+        self._build_bonuses()
+
+    @staticmethod
+    def from_arrays(
+            mapid: int,
+            name: str,
+            names: List[str],
+            terr_ids: np.ndarray,
+            indptr: np.ndarray,
+            indices: np.ndarray,
+            bonuses: List[Bonus],
+            adjacency: Optional[np.ndarray] = None) -> MapStructure:
+        """Build a map from its CSR adjacency without going through networkx"""
+        mapstruct = object.__new__(MapStructure)
+        mapstruct.mapid = mapid
+        mapstruct.name = name
+        mapstruct._nx = None
+        mapstruct.bonuses = [bonus for bonus in bonuses if bonus.value != 0 and bonus.terr]
+        mapstruct.names = list(names)
+        mapstruct.terr_ids = terr_ids
+        mapstruct._build_adjacency(indptr, indices, adjacency)
+        mapstruct._build_bonuses()
+        return mapstruct
+
+    @property
+    def _graph(self):
+        """The map as a networkx graph, only built when something asks for it"""
+        if self._nx is None:
+            import networkx as nx
+            graph = nx.Graph()
+            for i, (name, old_id) in enumerate(zip(self.names, self.terr_ids.tolist())):
+                graph.add_node(i, name=name, old_id=old_id)
+            graph.add_edges_from(self.edges.tolist())
+            self._nx = graph
+        return self._nx
+
+    def _build_adjacency(self, indptr: np.ndarray, indices: np.ndarray, adjacency: Optional[np.ndarray] = None):
+        """Precompute the graph as arrays so lookups never touch networkx
+
+        indptr/indices are the CSR form with every neighbor list sorted, and
+        edges holds both directions of every connection sorted by (src, dst),
+        which makes its second column the CSR indices.
+        """
+        n = len(indptr) - 1
+        edges = np.stack([np.repeat(np.arange(n), np.diff(indptr)), indices], axis=1).astype(np.intp)
+        if adjacency is None and n <= DENSE_ADJACENCY_LIMIT:
+            adjacency = np.zeros((n, n), dtype=bool)
+            adjacency[edges[:, 0], edges[:, 1]] = True
+        # shared by every state on the map and handed out as views by neighbors(),
+        # so they're read-only views that nobody can shuffle out of order
+        self.edges = _readonly(edges)
+        self.indices = _readonly(indices)
+        self.indptr = _readonly(indptr)
+        self.degree = _readonly(np.diff(indptr))
+        self.adjacency = None if adjacency is None else _readonly(adjacency)
+
+    def _build_bonuses(self):
+        """Store the territory-by-bonus incidence matrix in CSR form, one row per bonus"""
+        members = [sorted(bonus.terr) for bonus in self.bonuses]
+        self.bonus_indices = np.array([terr for terrs in members for terr in terrs], dtype=np.intp)
+        self.bonus_indptr = np.cumsum([0] + [len(terrs) for terrs in members])
+        self.bonus_sizes = np.diff(self.bonus_indptr)
+        self.bonus_values = np.array([bonus.value for bonus in self.bonuses], dtype=int)
+        # the transpose, one row per territory listing the bonuses it belongs to
+        order = np.argsort(self.bonus_indices, kind="stable")
+        self.terr_bonus_indices = np.repeat(np.arange(len(self.bonuses)), self.bonus_sizes)[order]
+        self.terr_bonus_indptr = np.searchsorted(self.bonus_indices[order], np.arange(len(self) + 1))
+
+    def __getstate__(self):
+        # the graph can be rebuilt, and leaving it out keeps networkx off the unpickling side
+        return { **self.__dict__, "_nx": None, "_wz_index": None }
+
+    def __setstate__(self, state):
+        # structures pickled before the arrays existed
+        if "_graph" in state:
+            state["_nx"] = state.pop("_graph")
+        self.__dict__.update(state)
+        if "names" not in state:
+            self.names = [self._nx.nodes[i]["name"] for i in range(len(self._nx.nodes))]
+            self.terr_ids = np.array([self._nx.nodes[i]["old_id"] for i in range(len(self._nx.nodes))], dtype=np.int64)
+        if "indptr" not in state:
+            self._build_adjacency(*_graph_to_csr(self._nx))
+        else:
+            # pickle doesn't keep arrays read-only
+            self._build_adjacency(self.indptr, self.indices, self.adjacency)
+        if "terr_bonus_indptr" not in state:
+            self.bonuses = [bonus for bonus in self.bonuses if bonus.terr]
+            self._build_bonuses()
+
+    def neighbors(self, src: int) -> np.ndarray:
+        return self.indices[self.indptr[src]:self.indptr[src + 1]]
+
+    def is_adjacent(self, src, dst):
+        """Whether dst borders src, elementwise when given arrays"""
+        if np.ndim(src) == 0 and np.ndim(dst) == 0:
+            if not (0 <= src < len(self) and 0 <= dst < len(self)):
+                raise IndexError(f"No territories {src} and {dst} on a map of {len(self)}")
+            if self.adjacency is not None:
+                return bool(self.adjacency[src, dst])
+            neighbors = self.neighbors(src)
+            i = np.searchsorted(neighbors, dst)
+            return i < len(neighbors) and neighbors[i] == dst
+        src, dst = np.asarray(src), np.asarray(dst)
+        for terrs in (src, dst):
+            if terrs.size and (terrs.min() < 0 or terrs.max() >= len(self)):
+                raise IndexError(f"Territories out of range for a map of {len(self)}")
+        if self.adjacency is not None:
+            return self.adjacency[src, dst]
+        keys = self.edge_keys
+        key = src * len(self) + dst
+        if len(keys) == 0:
+            return np.zeros(key.shape, dtype=bool)
+        return keys[np.minimum(np.searchsorted(keys, key), len(keys) - 1)] == key
+
+    @property
+    def edge_keys(self) -> np.ndarray:
+        """src * T + dst for every edge, sorted like edges, for looking up many pairs at once"""
+        if getattr(self, "_edge_keys", None) is None:
+            self._edge_keys = self.edges[:, 0] * len(self) + self.edges[:, 1]
+        return self._edge_keys
+
+    # The tables below are built on first use and saved by the map store
+
+    @property
+    def distances(self) -> np.ndarray:
+        """(T, T) int16 hop distances between every pair of territories, UNREACHABLE if not connected"""
+        if getattr(self, "_distances", None) is None:
+            self._distances = _bfs(np.eye(len(self), dtype=bool), self.indptr, self.indices)
+        return self._distances
+
+    @property
+    def bonus_members(self) -> np.ndarray:
+        """(B, T) whether each territory is part of each bonus"""
+        members = np.zeros((len(self.bonuses), len(self)), dtype=bool)
+        members[np.repeat(np.arange(len(self.bonuses)), self.bonus_sizes), self.bonus_indices] = True
+        return members
+
+    @property
+    def bonus_boundary(self) -> np.ndarray:
+        """(B, T) the territories of each bonus that border a territory outside of it"""
+        if getattr(self, "_bonus_boundary", None) is None:
+            members = self.bonus_members
+            self._bonus_boundary = members & _segment_any(~members[:, self.indices], self.indptr)
+        return self._bonus_boundary
+
+    @property
+    def bonus_frontier(self) -> np.ndarray:
+        """(B, T) the territories outside each bonus that border it"""
+        if getattr(self, "_bonus_frontier", None) is None:
+            members = self.bonus_members
+            self._bonus_frontier = ~members & _segment_any(members[:, self.indices], self.indptr)
+        return self._bonus_frontier
+
+    @property
+    def bonus_adjacency(self) -> np.ndarray:
+        """(B, B) whether two bonuses border each other"""
+        if getattr(self, "_bonus_adjacency", None) is None:
+            touching = (self.bonus_members.astype(np.int32) @ self.bonus_frontier.T.astype(np.int32)) > 0
+            touching |= touching.T
+            np.fill_diagonal(touching, False)
+            self._bonus_adjacency = touching
+        return self._bonus_adjacency
 
-    def neighbors(self, src: int) -> Iterable[int]:
-        return self._graph.neighbors(src)
+    def bonuses_of(self, terr: int) -> np.ndarray:
+        return self.terr_bonus_indices[self.terr_bonus_indptr[terr]:self.terr_bonus_indptr[terr + 1]]
+
+    def bonus_owners(self, owner: np.ndarray) -> np.ndarray:
+        """Map a (..., T) owner array to the (..., B) owner of every bonus, 0 if split"""
+        first, complete = self._bonus_holders(owner)
+        return np.where(complete, first, 0)
+
+    def incomes(self, owner: np.ndarray, players: Sequence[int]) -> np.ndarray:
+        """Income of each of the players for a (..., T) owner array, shaped (..., P)"""
+        first, complete = self._bonus_holders(owner)
+        held = (first[..., None, :] == np.asarray(players)[:, None]) & complete[..., None, :]
+        return BASE_INCOME + held @ self.bonus_values
+
+    def _bonus_holders(self, owner: np.ndarray):
+        members = owner[..., self.bonus_indices]
+        first = members[..., self.bonus_indptr[:-1]]
+        split = members != np.repeat(first, self.bonus_sizes, axis=-1)
+        return first, ~_segment_any(split, self.bonus_indptr)
 
     def _terr_name(self, terr: int) -> str:
-        return self._graph.nodes.get(terr)["name"]
+        return self.names[terr]
     
-    def _wz_terr_id(self, terr: int) -> str:
-        return self._graph.nodes.get(terr)["old_id"]
+    def _wz_terr_id(self, terr: int) -> int:
+        return int(self.terr_ids[terr])
+
+    def _terr_index(self, wz_terr_id) -> int:
+        if getattr(self, "_wz_index", None) is None:
+            self._wz_index = { terr_id: i for i, terr_id in enumerate(self.terr_ids.tolist()) }
+        return self._wz_index[int(wz_terr_id)]
 
     def __len__(self):
-        return len(self._graph.nodes) 
+        return len(self.indptr) - 1
+
+def _graph_to_csr(graph):
+    edges = sorted(
+        edge
+        for src, dst in graph.edges
+        if src != dst
+        for edge in ((src, dst), (dst, src))
+    )
+    indices = np.array([dst for _, dst in edges], dtype=np.intp)
+    indptr = np.searchsorted(np.array([src for src, _ in edges], dtype=np.intp), np.arange(len(graph.nodes) + 1))
+    return indptr, indices
+
+def _readonly(array: np.ndarray) -> np.ndarray:
+    view = np.asarray(array).view()
+    view.flags.writeable = False
+    return view
+
+def _segment_any(mask: np.ndarray, indptr: np.ndarray) -> np.ndarray:
+    """Reduce a (..., nnz) mask over CSR segments to whether any entry of each segment is set"""
+    counts = np.cumsum(mask, axis=-1)
+    counts = np.concatenate([np.zeros(counts.shape[:-1] + (1,), dtype=counts.dtype), counts], axis=-1)
+    return counts[..., indptr[1:]] > counts[..., indptr[:-1]]
+
+def _bfs(sources: np.ndarray, indptr: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    """Hop distance from the nearest source for every row of a (..., T) source mask, all rows at once"""
+    distance = np.full(sources.shape, UNREACHABLE, dtype=np.int16)
+    distance[sources] = 0
+    reached = sources.copy()
+    frontier = sources
+    hops = 0
+    while frontier.any():
+        hops += 1
+        frontier = _segment_any(frontier[..., indices], indptr) & ~reached
+        distance[frontier] = hops
+        reached |= frontier
+    return distance
 
 @pretty_print("mapstruct")
 class MapState:
-    def __init__(self, armies: np.ndarray, owner: np.ndarray, mapstruct: MapStructure):
+    def __init__(self, armies: np.ndarray, owner: np.ndarray, mapstruct: MapStructure, playerids: Optional[np.ndarray] = None):
         assert armies.shape == owner.shape
         self.armies = armies
         self.owner = owner
         self.mapstruct = mapstruct
+        # when set, owner holds indices into this table of real player ids (0 is neutral)
+        self.playerids = playerids
+        self._tracker: Optional[_Tracker] = None
     
     def __len__(self) -> int:
         return len(self.armies)
 
+    def compact(self, playerids: Optional[Sequence[int]] = None) -> MapState:
+        """A copy with int32 armies and uint8 owner indices into a player id table
+
+        Pass the game's players so indices stay the same as players get
+        eliminated; by default the table is built from the current owners.
+        Orders for a compact state use player indices, which _encode and
+        api.send_orders(playerids=...) turn back into real ids.
+        """
+        if self.playerids is not None:
+            return self.copy()
+        table = np.union1d([0], self.owner if playerids is None else playerids)
+        assert len(table) <= 256 and np.isin(self.owner, table).all()
+        state = MapState(
+            self.armies.astype(np.int32),
+            np.searchsorted(table, self.owner).astype(np.uint8),
+            self.mapstruct,
+            playerids=table
+        )
+        return state.track() if self._tracker is not None else state
+
+    def expand(self) -> MapState:
+        """The inverse of compact, with owner holding real player ids again"""
+        if self.playerids is None:
+            return self.copy()
+        state = MapState(self.armies.copy(), self.playerids[self.owner], self.mapstruct)
+        return state.track() if self._tracker is not None else state
+
+    def player_index(self, playerid: int) -> int:
+        """The value owner uses for a real player id"""
+        if self.playerids is None:
+            return playerid
+        return int(np.searchsorted(self.playerids, playerid))
+
+    def track(self) -> MapState:
+        """Switch to incremental mode, where income and borders are kept up to date as owners change
+
+        Owner changes must go through set_owner from then on; writing to the
+        owner array directly leaves the caches stale.
+        """
+        self._tracker = _Tracker(self)
+        return self
+
+    def zobrist(self) -> int:
+        """64-bit hash of the position, maintained incrementally in tracked mode"""
+        if self._tracker is not None:
+            return self._tracker.hash
+        return _zobrist_hash(self.armies, self.owner)
+
+    def _rehash(self, terrs: Iterable[int]):
+        # toggles the given territories' keys, called around every mutation
+        if self._tracker is not None:
+            for terr in set(terrs):
+                self._tracker.hash ^= _zobrist_key(int(terr), int(self.owner[terr]), int(self.armies[terr]))
+
+    def set_owner(self, terr: int, player: int):
+        old = self.owner[terr]
+        self.owner[terr] = player
+        if self._tracker is not None and old != player:
+            self._tracker.move(self, terr, old, player)
+
     def winner(self) -> Optional[int]:
-        return first(player for player in self.owner if player != 0)
-        # p = 0
-        # for owner in self.owner:
-        #     if owner != 0 and p == 0:
-        #         # first non-neutral player
-        #         p = owner
-        #     elif owner != p and owner != 0 != p:
-        #         # two different players are left
-        #         return None
-        # return p
-
-    def neighbors(self, src: int, include_self: bool = False) -> List[int]:
-        return list(self.mapstruct.neighbors(src)) + ([src] if include_self else [])
+        players = self.players()
+        return players[0] if len(players) == 1 else None
+
+    def players(self) -> List[int]:
+        return [int(player) for player in np.unique(self.owner) if player != 0]
+
+    def neighbors(self, src: int, include_self: bool = False) -> np.ndarray:
+        neighbors = self.mapstruct.neighbors(src)
+        return np.append(neighbors, src) if include_self else neighbors
 
     def owned_by(self, playerid: int) -> List[Int]:
         return np.where(self.owner == playerid)[0].tolist()
 
     def borders(self, player: int, include_neutrals=True) -> List[int]:
-        return [
-            src for src in range(len(self))
-            if self.owner[src] == player
-            and any(
-                self.owner[dst] != player
-                and (include_neutrals or self.owner[dst] != 0)
-                for dst in self.neighbors(src)
-            )
-        ]
+        if self._tracker is not None:
+            return self._tracker.borders(self, player, include_neutrals)
+        owned = self.owner == player
+        enemy = ~owned if include_neutrals else ~owned & (self.owner != 0)
+        src, dst = self.mapstruct.edges.T
+        return np.unique(src[owned[src] & enemy[dst]]).tolist()
 
     def copy(self) -> MapState:
-        return MapState(
+        state = MapState(
             self.armies.copy(),
             self.owner.copy(),
-            self.mapstruct
+            self.mapstruct,
+            self.playerids
         )
+        if self._tracker is not None:
+            state._tracker = self._tracker.copy()
+        return state
 
     def assert_valid(self):
         assert (self.armies >= 0).all()
         assert len(self.armies) == len(self.owner) == len(self.mapstruct)
 
     def income(self, player: int) -> int:
-        n = 5
-        for bonus in self.mapstruct.bonuses:
-            if bonus.owned_by(self, player):
-                n += bonus.value
-        return n
+        if self._tracker is not None:
+            return self._tracker.income.get(player, BASE_INCOME)
+        return int(self.mapstruct.incomes(self.owner, [player])[0])
+
+    def incomes(self, players: Optional[Sequence[int]] = None) -> Dict[int, int]:
+        players = self.players() if players is None else players
+        if self._tracker is not None:
+            return { player: self._tracker.income.get(player, BASE_INCOME) for player in players }
+        return dict(zip(players, self.mapstruct.incomes(self.owner, players).tolist()))
 
     def total_armies(self, player: int) -> int:
         return self.armies[self.owner == player].sum()
 
+    def distances(self, player: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Hops from every territory to the nearest enemy and to the nearest neutral territory"""
+        sources = np.stack([(self.owner != player) & (self.owner != 0), self.owner == 0])
+        enemy, neutral = _bfs(sources, self.mapstruct.indptr, self.mapstruct.indices)
+        return enemy, neutral
+
+class _Tracker:
+    """Per-bonus owned counts and per-player frontiers for a MapState in incremental mode
+
+    An owner change touches only the bonuses containing the territory and
+    the territory's neighbors, so it costs O(degree) instead of a rescan.
+    """
+    def __init__(self, state: MapState):
+        mapstruct = state.mapstruct
+        self.counts: Dict[int, np.ndarray] = {}
+        self.income: Dict[int, int] = {}
+        for player in np.unique(state.owner).tolist():
+            members = (state.owner[mapstruct.bonus_indices] == player).astype(int)
+            self.counts[player] = np.add.reduceat(members, mapstruct.bonus_indptr[:-1]) if len(members) else np.zeros(0, dtype=int)
+            self.income[player] = BASE_INCOME + int(mapstruct.bonus_values[self.counts[player] == mapstruct.bonus_sizes].sum())
+
+        # number of neighbors owned by someone else, for every territory
+        src, dst = mapstruct.edges.T
+        self.foreign = np.bincount(src, weights=state.owner[src] != state.owner[dst], minlength=len(state)).astype(int)
+        self.frontier: Dict[int, Set[int]] = defaultdict(set)
+        for terr in np.where(self.foreign > 0)[0].tolist():
+            self.frontier[state.owner[terr].item()].add(terr)
+        self.hash = _zobrist_hash(state.armies, state.owner)
+
+    def copy(self) -> _Tracker:
+        tracker = object.__new__(_Tracker)
+        tracker.counts = { player: counts.copy() for player, counts in self.counts.items() }
+        tracker.income = self.income.copy()
+        tracker.foreign = self.foreign.copy()
+        tracker.frontier = defaultdict(set, { player: terrs.copy() for player, terrs in self.frontier.items() })
+        tracker.hash = self.hash
+        return tracker
+
+    def move(self, state: MapState, terr: int, old: int, new: int):
+        mapstruct = state.mapstruct
+        old, new = int(old), int(new)
+        if new not in self.counts:
+            self.counts[new] = np.zeros(len(mapstruct.bonuses), dtype=int)
+            self.income[new] = BASE_INCOME
+        for bonus in mapstruct.bonuses_of(terr):
+            if self.counts[old][bonus] == mapstruct.bonus_sizes[bonus]:
+                self.income[old] -= int(mapstruct.bonus_values[bonus])
+            self.counts[old][bonus] -= 1
+            self.counts[new][bonus] += 1
+            if self.counts[new][bonus] == mapstruct.bonus_sizes[bonus]:
+                self.income[new] += int(mapstruct.bonus_values[bonus])
+
+        self.frontier[old].discard(terr)
+        foreign = 0
+        for neighbor in mapstruct.neighbors(terr).tolist():
+            owner = state.owner[neighbor].item()
+            foreign += owner != new
+            self.foreign[neighbor] += (owner != new) - (owner != old)
+            if self.foreign[neighbor] > 0:
+                self.frontier[owner].add(neighbor)
+            else:
+                self.frontier[owner].discard(neighbor)
+        self.foreign[terr] = foreign
+        if foreign > 0:
+            self.frontier[new].add(terr)
+
+    def borders(self, state: MapState, player: int, include_neutrals: bool) -> List[int]:
+        return sorted(
+            src for src in self.frontier.get(player, ())
+            if include_neutrals or _has_enemy(state.owner[state.mapstruct.neighbors(src)], player)
+        )
+
+def _zobrist_key(terr: int, owner: int, armies: int) -> int:
+    # splitmix64 of the packed (armies, terr, owner) triple
+    x = (min(armies, ZOBRIST_ARMY_CAP) | terr << 10 | owner << 30) + 0x9e3779b97f4a7c15 & _MASK64
+    x = (x ^ x >> 30) * 0xbf58476d1ce4e5b9 & _MASK64
+    x = (x ^ x >> 27) * 0x94d049bb133111eb & _MASK64
+    return x ^ x >> 31
+
+def _zobrist_hash(armies: np.ndarray, owner: np.ndarray) -> int:
+    """XOR of _zobrist_key over every territory, computed in one pass"""
+    u = np.uint64
+    x = np.minimum(armies, ZOBRIST_ARMY_CAP).astype(u) | np.arange(len(armies), dtype=u) << u(10) | owner.astype(u) << u(30)
+    x = x + u(0x9e3779b97f4a7c15)
+    x = (x ^ x >> u(30)) * u(0xbf58476d1ce4e5b9)
+    x = (x ^ x >> u(27)) * u(0x94d049bb133111eb)
+    return int(np.bitwise_xor.reduce(x ^ x >> u(31)))
+
+def _has_enemy(owners: np.ndarray, player: int) -> bool:
+    return bool(((owners != player) & (owners != 0)).any())
+
+@pretty_print("mapstruct")
+class BatchMapState:
+    """The states of N games on the same map, stored as (N, T) arrays
+
+    Queries answer for every game at once. Per-territory results, which
+    would be ragged lists for a single MapState, are (N, T) boolean masks.
+    Compact states can be batched when they share a player id table.
+    """
+    def __init__(self, armies: np.ndarray, owner: np.ndarray, mapstruct: MapStructure, playerids: Optional[np.ndarray] = None):
+        assert armies.shape == owner.shape and armies.ndim == 2
+        self.armies = armies
+        self.owner = owner
+        self.mapstruct = mapstruct
+        self.playerids = playerids
+
+    @staticmethod
+    def from_states(states: Iterable[MapState]) -> BatchMapState:
+        states = list(states)
+        return BatchMapState(
+            np.stack([state.armies for state in states]),
+            np.stack([state.owner for state in states]),
+            states[0].mapstruct,
+            states[0].playerids
+        )
+
+    def states(self) -> List[MapState]:
+        return [self[i] for i in range(len(self))]
+
+    def __len__(self) -> int:
+        return len(self.armies)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice) or isinstance(i, np.ndarray):
+            return BatchMapState(self.armies[i], self.owner[i], self.mapstruct, self.playerids)
+        # shares memory with the batch, so orders applied in place show up here
+        return MapState(self.armies[i], self.owner[i], self.mapstruct, self.playerids)
+
+    def winner(self) -> np.ndarray:
+        """The winner of each game, or 0 while more than one player is left"""
+        # neutral is 0 and owners are never negative, so the largest owner is a player if any is left
+        first = self.owner.max(axis=1)
+        alone = (self.owner == first[:, None]) | (self.owner == 0)
+        return np.where(alone.all(axis=1), first, 0)
+
+    def player_index(self, playerid: int) -> int:
+        if self.playerids is None:
+            return playerid
+        return int(np.searchsorted(self.playerids, playerid))
+
+    def owned_by(self, playerid: int) -> np.ndarray:
+        return self.owner == playerid
+
+    def borders(self, player: int, include_neutrals=True) -> np.ndarray:
+        owned = self.owner == player
+        enemy = ~owned if include_neutrals else ~owned & (self.owner != 0)
+        src, dst = self.mapstruct.edges.T
+        return _segment_any(owned[:, src] & enemy[:, dst], self.mapstruct.indptr)
+
+    def copy(self) -> BatchMapState:
+        return BatchMapState(
+            self.armies.copy(),
+            self.owner.copy(),
+            self.mapstruct,
+            self.playerids
+        )
+
+    def assert_valid(self):
+        assert (self.armies >= 0).all()
+        assert self.armies.shape == self.owner.shape == (len(self), len(self.mapstruct))
+
+    def income(self, player: int) -> np.ndarray:
+        return self.incomes([player])[:, 0]
+
+    def incomes(self, players: Sequence[int]) -> np.ndarray:
+        """Income of each player in each game, shaped (N, P)"""
+        return self.mapstruct.incomes(self.owner, players)
+
+    def distances(self, player: int) -> Tuple[np.ndarray, np.ndarray]:
+        """MapState.distances for every game, as two (N, T) arrays"""
+        sources = np.stack([(self.owner != player) & (self.owner != 0), self.owner == 0])
+        enemy, neutral = _bfs(sources, self.mapstruct.indptr, self.mapstruct.indices)
+        return enemy, neutral
+
+    def total_armies(self, player: int) -> np.ndarray:
+        return np.where(self.owner == player, self.armies, 0).sum(axis=1)
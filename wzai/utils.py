@@ -1,30 +1,40 @@
 from __future__ import annotations
 
-from . import api
-from . import types
-
-from typing import Iterable, TypeVar, Optional
-from wonderwords import RandomWord
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterable, TypeVar, Optional
 import os
 import pickle
 
-def load_mapstruct(mapid: int, cache: str = None) -> game_types.MapStructure:
-    """Download a map or load it from a cache"""
+if TYPE_CHECKING:
+    from . import types
+
+def load_mapstruct(mapid: int, cache: str = None) -> types.MapStructure:
+    """Download a map or load it from a cache, see wzai.mapstore"""
+    from . import mapstore
     if cache is not None:
-        os.makedirs(cache, exist_ok=True)
+        if mapstore.exists(cache, mapid):
+            return mapstore.load(cache, mapid)
         if os.path.isfile(f"{cache}/{mapid}.pkl"):
-            return pickle.load(open(f"{cache}/{mapid}.pkl", "rb"))
+            # carry over caches from before the map store
+            with open(f"{cache}/{mapid}.pkl", "rb") as file:
+                mapstruct = pickle.load(file)
+            mapstore.save(mapstruct, cache)
+            return mapstruct
 
-    # The only way to download map data seems to be by creating a game
-    gameid = api.create_game([1, 2], botgame=True, mapid=mapid)
-    mapstruct = api.map_structure(gameid, botgame=True)
-    
+    mapstruct = mapstore.download(mapid)
     if cache is not None:
-        pickle.dump(mapstruct, open(f"{cache}/{mapid}.pkl", "wb"))
+        mapstore.save(mapstruct, cache)
     return mapstruct
 
 def random_name():
-    return RandomWord().word(include_parts_of_speech=["adjective"]) + "-" + RandomWord().word(include_parts_of_speech=["noun"])
+    words = _random_word()
+    return words.word(include_parts_of_speech=["adjective"]) + "-" + words.word(include_parts_of_speech=["noun"])
+
+@lru_cache(maxsize=None)
+def _random_word():
+    # loading the word lists is the slow part, so it happens once per process
+    from wonderwords import RandomWord
+    return RandomWord()
 
 def pretty_print(*attrs: str):
     def handler(c):
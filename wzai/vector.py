@@ -0,0 +1,138 @@
+from .agent import Agent
+from .gym import Game, LocalGame, observation_space, action_space
+from .types import MapStructure, BatchMapState
+
+from typing import Any, Callable, Dict, Optional, Sequence
+from gymnasium.vector.utils import batch_space, create_shared_memory, read_from_shared_memory, write_to_shared_memory, iterate
+import gymnasium as gym
+import multiprocessing as mp
+import traceback
+import numpy as np
+
+class VectorGame(gym.vector.VectorEnv):
+    """Runs N Games on the same map in worker processes
+
+    Workers write their observations straight into shared (N, T) armies and
+    owner buffers, so nothing but rewards and flags is pickled on the way
+    back. The observation returned by reset/step is a dict of views of those
+    buffers, and batch() wraps the same memory as a BatchMapState. Both are
+    overwritten by the next step, so copy them to keep them.
+
+    Actions are either one order list (or action_space sample) per game, or
+    a batched action_space dict. Games that end are reset within the same
+    step, with the options of the last reset and the finished game's reward
+    and flags still reported. An exception in a worker is raised again by
+    reset or step, and the worker carries on.
+    """
+    def __init__(self, env_fns: Sequence[Callable[[], Game]], mapstruct: MapStructure, context: Optional[str] = None):
+        self.num_envs = len(env_fns)
+        self.mapstruct = mapstruct
+        self.single_observation_space = observation_space(mapstruct)
+        self.single_action_space = action_space(mapstruct)
+        self.observation_space = batch_space(self.single_observation_space, self.num_envs)
+        self.action_space = batch_space(self.single_action_space, self.num_envs)
+
+        ctx = mp.get_context(context)
+        self._shared = create_shared_memory(self.single_observation_space, n=self.num_envs, ctx=ctx)
+        self._observations = read_from_shared_memory(self.single_observation_space, self._shared, n=self.num_envs)
+        self._pipes = []
+        self._processes = []
+        for index, env_fn in enumerate(env_fns):
+            parent, child = ctx.Pipe()
+            process = ctx.Process(
+                target=_worker,
+                args=(index, env_fn, child, parent, self._shared, self.single_observation_space),
+                daemon=True,
+            )
+            process.start()
+            child.close()
+            self._pipes.append(parent)
+            self._processes.append(process)
+
+    @staticmethod
+    def local(mapstruct: MapStructure, num_envs: int, opponent: Optional[Agent] = None, max_turns: int = 200, **kwargs) -> "VectorGame":
+        return VectorGame([_LocalGameFactory(mapstruct, opponent, max_turns)] * num_envs, mapstruct, **kwargs)
+
+    def batch(self) -> BatchMapState:
+        return BatchMapState(self._observations["armies"], self._observations["owner"], self.mapstruct)
+
+    def reset(self, *, seed: Optional[int] = None, options: Optional[Dict[str, Any]] = None):
+        seeds = [None] * self.num_envs if seed is None else [seed + i for i in range(self.num_envs)]
+        for pipe, env_seed in zip(self._pipes, seeds):
+            pipe.send(("reset", (env_seed, options or {})))
+        infos = self._receive()
+        return self._observations, _stack_infos(infos)
+
+    def step(self, actions):
+        if isinstance(actions, dict):
+            actions = list(iterate(self.action_space, actions))
+        for pipe, action in zip(self._pipes, actions):
+            pipe.send(("step", action))
+        rewards, terminated, truncated, infos = zip(*self._receive())
+        return (
+            self._observations,
+            np.array(rewards, dtype=float),
+            np.array(terminated, dtype=bool),
+            np.array(truncated, dtype=bool),
+            _stack_infos(infos),
+        )
+
+    def _receive(self) -> list:
+        # every worker answers before anything is raised, so the pipes stay in step
+        results = [pipe.recv() for pipe in self._pipes]
+        for index, (ok, result) in enumerate(results):
+            if not ok:
+                exctype, message, trace = result
+                raise exctype(message) from _WorkerTraceback(f"in game {index}\n{trace}")
+        return [result for _, result in results]
+
+    def close_extras(self, **kwargs):
+        for pipe in self._pipes:
+            pipe.send(("close", None))
+        for process in self._processes:
+            process.join()
+        for pipe in self._pipes:
+            pipe.close()
+
+class _LocalGameFactory:
+    # a picklable env_fn, for start methods other than fork
+    def __init__(self, mapstruct: MapStructure, opponent: Optional[Agent], max_turns: int):
+        self.mapstruct = mapstruct
+        self.opponent = opponent
+        self.max_turns = max_turns
+
+    def __call__(self) -> LocalGame:
+        return LocalGame(self.mapstruct, opponent=self.opponent, max_turns=self.max_turns)
+
+class _WorkerTraceback(Exception):
+    # the cause of an exception raised again in the parent, so its traceback shows the worker's
+    pass
+
+def _worker(index: int, env_fn: Callable[[], Game], pipe, parent_pipe, shared, space):
+    parent_pipe.close()
+    env = env_fn()
+    options: Dict[str, Any] = {}
+    while True:
+        command, data = pipe.recv()
+        if command == "close":
+            env.close()
+            pipe.close()
+            break
+        try:
+            if command == "reset":
+                seed, options = data
+                observation, info = env.reset(seed=seed, options=options)
+                write_to_shared_memory(space, index, observation, shared)
+                pipe.send((True, info))
+            elif command == "step":
+                observation, reward, terminated, truncated, info = env.step(data)
+                if terminated or truncated:
+                    observation, _ = env.reset(options=options)
+                write_to_shared_memory(space, index, observation, shared)
+                pipe.send((True, (reward, terminated, truncated, info)))
+        except Exception as e:
+            pipe.send((False, (type(e), str(e), traceback.format_exc())))
+
+def _stack_infos(infos: Sequence[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    keys = { key for info in infos for key in info }
+    return { key: np.array([info.get(key) for info in infos]) for key in keys }